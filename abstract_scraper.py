@@ -5,17 +5,48 @@ An abstract class. To use it, implement this class
 in a file, and place that file in the "scrapers/"
 directory. JobSpotBot will use that scraper as a
 source of open jobs.
+
+Scrapers which spend most of their time waiting on
+HTTP requests can implement AsyncAbstractScraper
+instead. JobSpotBot runs all async scrapers on one
+event loop, and hands them a shared HTTP session.
+
+Scrapers of job boards with many pages can implement
+StreamingAbstractScraper instead, and yield jobs as
+they're found. JobSpotBot stops them once they reach
+jobs it already knows about.
 """
 
 # ---------- IMPORTS ----------
 
 # Python Default Imports
 from abc import ABC, abstractmethod
+import asyncio
+from typing import TYPE_CHECKING, Iterable, Iterator
+
+# Local Imports
+import job_normalization
+
+# Only async scrapers need aiohttp, so regular
+# scrapers don't depend on it
+if TYPE_CHECKING:
+    import aiohttp
 
 # ---------- CLASSES ----------
 
 
 class AbstractScraper(ABC):
+    # How often, in seconds, this job board should be
+    # checked. None uses check_interval_in_s from the
+    # storage file.
+    check_interval_in_s: int | None = None
+
+    # Query parameters (in lowercase) this job board adds to
+    # links which don't identify the job, on top of common
+    # tracking parameters (see job_normalization.py), for
+    # example frozenset({"ref", "sid"})
+    ignored_link_params: frozenset[str] = frozenset()
+
     @abstractmethod
     def scrape_open_jobs(self) -> set[tuple[str, str]]:
         """
@@ -26,3 +57,110 @@ class AbstractScraper(ABC):
                  job's link.
         """
         pass
+
+    def normalize_job(self, title: str, link: str) -> tuple[str, str]:
+        """
+        Returns the stable identity of a job this scraper
+        found, which is what's compared with known jobs and
+        sent to Discord. Override it to add rules for this
+        job board (ex. rewriting links to a canonical form),
+        but keep calling this implementation.
+        """
+        return job_normalization.normalize_job(title, link, self.ignored_link_params)
+
+
+class AsyncAbstractScraper(AbstractScraper):
+    @abstractmethod
+    async def scrape_open_jobs_async(self, session: "aiohttp.ClientSession") -> set[tuple[str, str]]:
+        """
+        Scrapes all open jobs from a job board.
+        :param session: An HTTP session shared by all async
+                        scrapers. Its connections are pooled
+                        and kept alive between checks, so
+                        don't close it.
+        :return: A set of open jobs represented by tuples. The
+                 first element of each tuple is the job's name,
+                 and the second element of each tuple is the
+                 job's link.
+        """
+        pass
+
+    def scrape_open_jobs(self) -> set[tuple[str, str]]:
+        """
+        Runs the async scraper on its own, with a session
+        of its own. JobSpotBot doesn't call this, it's only
+        here so async scrapers can be run outside the bot.
+        """
+
+        import aiohttp
+
+        async def scrape() -> set[tuple[str, str]]:
+            async with aiohttp.ClientSession() as session:
+                return await self.scrape_open_jobs_async(session)
+
+        return asyncio.run(scrape())
+
+
+class StreamingAbstractScraper(AbstractScraper):
+    # How many known jobs in a row the scraper may yield
+    # before it's stopped
+    known_jobs_before_stop: int = 25
+
+    # How often, in seconds, every page is scraped anyway,
+    # so jobs which were taken down are forgotten
+    full_sweep_interval_in_s: int = 24 * 60 * 60
+
+    @abstractmethod
+    def scrape_open_jobs_incrementally(self) -> Iterator[tuple[str, str] | Iterable[tuple[str, str]]]:
+        """
+        Scrapes open jobs from a job board, newest first,
+        yielding either one job or one page of jobs at a time.
+        JobSpotBot may stop asking for more at any point, so
+        only fetch the next page once it's asked for.
+        :return: A generator of open jobs represented by tuples.
+                 The first element of each tuple is the job's
+                 name, and the second element of each tuple is
+                 the job's link.
+        """
+        pass
+
+    def scrape_until_known(self, known_jobs: set[tuple[str, str]] | None) -> tuple[set[tuple[str, str]], bool]:
+        """
+        Collects jobs from scrape_open_jobs_incrementally()
+        until known_jobs_before_stop jobs in a row are in
+        known_jobs (as they are, or once normalized). If
+        known_jobs is None, every job is collected.
+
+        :return: The jobs collected, and whether they're every
+                 open job (False if the scraper was stopped).
+        """
+
+        jobs = set()
+        num_known_in_a_row = 0
+        stream = iter(self.scrape_open_jobs_incrementally())
+
+        try:
+            for item in stream:
+                # A single job, or a page of them
+                page = [item] if isinstance(item, tuple) and len(item) == 2 and isinstance(item[0], str) else item
+
+                for title, link in page:
+                    job = (title, link)
+                    jobs.add(job)
+
+                    if known_jobs is not None and (job in known_jobs or self.normalize_job(title, link) in known_jobs):
+                        num_known_in_a_row += 1
+                    else:
+                        num_known_in_a_row = 0
+
+                if known_jobs is not None and num_known_in_a_row >= self.known_jobs_before_stop:
+                    return jobs, False
+        finally:
+            # Stops generators, so they don't fetch more pages
+            if hasattr(stream, "close"):
+                stream.close()
+
+        return jobs, True
+
+    def scrape_open_jobs(self) -> set[tuple[str, str]]:
+        return self.scrape_until_known(None)[0]
@@ -0,0 +1,154 @@
+"""
+Adaptive Polling | Written by Joshua Sheldon
+
+Learns how often each job board posts new jobs, and
+picks a check interval for it accordingly. Rates are
+learned separately for every hour of the day, on
+weekdays and weekends, so a board which is busy during
+business hours is checked often then, and rarely at
+night. Learned rates are saved to a file between runs.
+"""
+
+# ---------- IMPORTS ----------
+
+# Python Default Imports
+import datetime
+import json
+from threading import Lock
+
+# Local Imports
+from persistent_storage import write_atomically
+
+# ---------- CONSTANTS ----------
+
+rates_file_name = "posting_rates.json"
+
+# How many new jobs we aim to find per check. Lower
+# values mean more checks and faster notifications.
+target_new_jobs_per_check = 0.5
+
+# How much weight each new observation gets
+smoothing_factor = 0.2
+
+# 24 hours on weekdays, then 24 hours on weekends
+num_buckets = 48
+
+# ---------- CLASSES & METHODS ----------
+
+
+def get_bucket(moment: datetime.datetime) -> int:
+    """Returns the hour-of-day bucket a moment falls into."""
+
+    if moment.weekday() >= 5:
+        return 24 + moment.hour
+
+    return moment.hour
+
+
+def smooth(previous: float, observed: float) -> float:
+    """Folds an observation into an exponentially weighted average."""
+    return smoothing_factor * observed + (1 - smoothing_factor) * previous
+
+
+class PostingRateModel:
+    """
+    Keeps a smoothed estimate of new jobs per hour for
+    every scraper, overall and in every bucket.
+    """
+
+    _min_interval_in_s: int
+    _max_interval_in_s: int
+    _rates: dict[str, dict]
+    _lock: Lock
+
+    def __init__(self, min_interval_in_s: int, max_interval_in_s: int):
+        self._min_interval_in_s = min_interval_in_s
+        self._max_interval_in_s = max_interval_in_s
+        self._rates = dict()
+        self._lock = Lock()
+
+        try:
+            file = open(rates_file_name, "r")
+            self._rates = json.loads(file.read())
+            file.close()
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            # Only learned data, start over
+            print(f"Failed to read posting rates, starting over: {e}")
+
+    def _get_rates(self, name: str) -> dict:
+        rates = self._rates.get(name)
+
+        if rates is None:
+            rates = {"overall": None, "buckets": [None] * num_buckets, "last_check": None}
+            self._rates[name] = rates
+
+        return rates
+
+    def record_check(self, name: str, num_new_jobs: int, moment: datetime.datetime, default_interval_in_s: float):
+        """
+        Records that a check of the scraper found the given
+        number of new jobs. The rate observed is the number
+        of new jobs over the time since the previous check.
+
+        Rates start out at the rate the default interval is
+        suited for, so a few quiet checks slow a scraper
+        down gradually rather than all at once.
+        """
+
+        with self._lock:
+            rates = self._get_rates(name)
+            last_check = rates["last_check"]
+            rates["last_check"] = moment.timestamp()
+
+            if last_check is None:
+                return
+
+            # Don't let a long outage dilute the rate
+            elapsed_in_s = min(moment.timestamp() - last_check, self._max_interval_in_s)
+            if elapsed_in_s <= 0:
+                return
+
+            observed_rate = num_new_jobs / (elapsed_in_s / 3600)
+            default_rate = target_new_jobs_per_check / (default_interval_in_s / 3600)
+            bucket = get_bucket(moment)
+
+            previous_overall = rates["overall"] if rates["overall"] is not None else default_rate
+            previous_bucket = rates["buckets"][bucket] if rates["buckets"][bucket] is not None else previous_overall
+
+            rates["buckets"][bucket] = smooth(previous_bucket, observed_rate)
+            rates["overall"] = smooth(previous_overall, observed_rate)
+
+    def get_interval_in_s(self, name: str, default_interval_in_s: float, moment: datetime.datetime) -> float:
+        """
+        Returns how long to wait before checking the scraper
+        again, so that each check finds about
+        target_new_jobs_per_check new jobs, within bounds.
+        Scrapers we know nothing about yet use the default.
+        """
+
+        with self._lock:
+            rates = self._rates.get(name)
+
+            if rates is None:
+                return default_interval_in_s
+
+            rate = rates["buckets"][get_bucket(moment)]
+            if rate is None:
+                rate = rates["overall"]
+
+        if rate is None:
+            return default_interval_in_s
+
+        if rate <= 0:
+            return self._max_interval_in_s
+
+        interval = target_new_jobs_per_check / rate * 3600
+        return min(max(interval, self._min_interval_in_s), self._max_interval_in_s)
+
+    def save(self):
+        with self._lock:
+            text = json.dumps(self._rates)
+
+        write_atomically(rates_file_name, text)
@@ -0,0 +1,118 @@
+"""
+Async Scraper Host | Written by Joshua Sheldon
+
+Runs async scrapers on a single event loop, which
+lives in a background thread for the lifetime of
+the bot. All async scrapers share one HTTP session,
+so connections to job boards are pooled and kept
+alive between checks.
+"""
+
+# ---------- IMPORTS ----------
+
+# Python Default Imports
+import asyncio
+import atexit
+from concurrent.futures import Future
+from threading import Lock, Thread
+from typing import TYPE_CHECKING, Callable
+
+# Local Imports
+from abstract_scraper import AsyncAbstractScraper
+
+# aiohttp is only imported once an async scraper runs
+# (see _create_session()), so it's optional otherwise
+if TYPE_CHECKING:
+    import aiohttp
+
+# ---------- CONSTANTS ----------
+
+# Most connections the shared session keeps open at
+# once, in total and to any one host
+connection_limit = 100
+connection_limit_per_host = 8
+
+# How long an idle connection is kept alive
+keepalive_timeout_in_s = 60
+
+# ---------- CLASSES & METHODS ----------
+
+
+class AsyncScraperHost:
+    """
+    Owns the event loop that async scrapers run on, and
+    the HTTP session handed to every async scraper.
+    """
+
+    _loop: asyncio.AbstractEventLoop
+    _thread: Thread
+    _session: "aiohttp.ClientSession"
+
+    def __init__(self):
+        self._loop = asyncio.new_event_loop()
+        self._thread = Thread(target=self._loop.run_forever, name="async-scrapers", daemon=True)
+        self._thread.start()
+
+        # The session has to be created on the loop it's used on
+        self._session = asyncio.run_coroutine_threadsafe(self._create_session(), self._loop).result()
+
+    async def _create_session(self) -> "aiohttp.ClientSession":
+        import aiohttp
+
+        connector = aiohttp.TCPConnector(
+            limit=connection_limit,
+            limit_per_host=connection_limit_per_host,
+            keepalive_timeout=keepalive_timeout_in_s
+        )
+        return aiohttp.ClientSession(connector=connector)
+
+    def submit(
+            self,
+            scraper: AsyncAbstractScraper,
+            on_start: Callable[[], None] | None = None
+    ) -> Future:
+        """
+        Schedules the scraper on the event loop.
+
+        :param on_start: Called on the event loop right before
+                         the scraper starts running.
+        :return: A future which resolves to the set of open
+                 jobs. Cancelling it cancels the scraper.
+        """
+
+        async def scrape() -> set[tuple[str, str]]:
+            if on_start is not None:
+                on_start()
+            return set(await scraper.scrape_open_jobs_async(self._session))
+
+        return asyncio.run_coroutine_threadsafe(scrape(), self._loop)
+
+    def close(self):
+        """Closes the shared session and stops the event loop."""
+
+        try:
+            asyncio.run_coroutine_threadsafe(self._session.close(), self._loop).result(timeout=5)
+        except Exception as e:
+            print(f"Failed to close async scraper session: {e}")
+
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+_host: AsyncScraperHost | None = None
+_host_lock = Lock()
+
+
+def get_async_scraper_host() -> AsyncScraperHost:
+    """
+    Returns the shared AsyncScraperHost, starting it
+    the first time it's needed.
+    """
+
+    global _host
+
+    with _host_lock:
+        if _host is None:
+            _host = AsyncScraperHost()
+            atexit.register(_host.close)
+
+        return _host
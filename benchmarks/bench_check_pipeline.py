@@ -0,0 +1,437 @@
+"""
+Check Pipeline Benchmarks | Written by Joshua Sheldon
+
+Measures how the check pipeline behaves as it scales,
+entirely offline. Synthetic scrapers stand in for job
+boards, with configurable latency and output size, and
+every benchmark runs against the real modules inside a
+temporary directory, so no real storage file is touched.
+
+Times (and peak memory, measured with tracemalloc in a
+separate run) are written as JSON, so results from two
+revisions can be compared:
+
+    python benchmarks/bench_check_pipeline.py --output before.json
+    python benchmarks/bench_check_pipeline.py --output after.json --compare before.json
+"""
+
+# ---------- IMPORTS ----------
+
+# Python Default Imports
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+from pathlib import Path
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable
+
+# Make the repository importable when run as a script
+repository_path = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(repository_path))
+
+# Local Imports
+from abstract_scraper import AbstractScraper
+from jobs_check import filter_jobs_with_keywords, new_jobs_check
+from job_store import backend_fingerprint, backend_json, backend_sqlite
+from keyword_matcher import KeywordMatcher
+from persistent_storage import Storage, fingerprints_file_name
+
+# ---------- CONSTANTS ----------
+
+default_known_jobs_sizes = [1_000, 10_000, 100_000, 1_000_000]
+quick_known_jobs_sizes = [1_000, 10_000]
+
+keyword_counts = [0, 10, 100, 1_000]
+
+# A whole check rewrites storage once per changed scraper,
+# so checks against the largest sets take far too long
+max_check_known_jobs = 100_000
+
+# (number of scrapers, latency of each, jobs from each)
+scraper_configurations = [
+    (1, 0.0, 1_000),
+    (10, 0.0, 1_000),
+    (10, 0.05, 1_000),
+    (50, 0.05, 200),
+]
+quick_scraper_configurations = [
+    (1, 0.0, 1_000),
+    (10, 0.05, 1_000),
+]
+
+# Regressions are flagged when a benchmark gets this
+# much slower than in the compared results
+regression_threshold = 1.2
+
+words = [
+    "software", "engineer", "senior", "junior", "data", "analyst", "product", "manager",
+    "designer", "intern", "backend", "frontend", "platform", "security", "research", "scientist"
+]
+
+# ---------- SYNTHETIC DATA ----------
+
+
+def make_jobs(count: int, prefix: str, seed: int) -> set[tuple[str, str]]:
+    """Creates a set of realistic-looking, unique jobs."""
+
+    rng = random.Random(seed)
+    jobs = set()
+
+    for i in range(count):
+        title = " ".join(rng.choice(words) for _ in range(4)).title()
+        link = f"https://jobs.example.com/{prefix}/{i}?ref=listing&id={rng.getrandbits(64):x}"
+        jobs.add((f"{title} {i}", link))
+
+    return jobs
+
+
+def make_keywords(count: int, seed: int) -> set[str]:
+    """
+    Creates count keywords, the same ones on every run
+    (whatever the hash seed), including a few which match.
+    """
+
+    rng = random.Random(seed)
+
+    # Make sure some keywords actually match. A dict keeps
+    # the keywords in the order they were added.
+    keywords = dict.fromkeys(words[:min(count, 4)])
+
+    while len(keywords) < count:
+        keywords[rng.choice(words)[:rng.randint(3, 8)] + str(rng.randint(0, count))] = None
+
+    return set(keywords)
+
+
+def make_synthetic_scraper(name: str, latency_in_s: float, jobs: set[tuple[str, str]]) -> AbstractScraper:
+    """
+    Creates a scraper which waits for latency_in_s and then
+    returns the given jobs. Each scraper gets its own class,
+    because scrapers are identified by their module.
+    """
+
+    def scrape_open_jobs(self) -> set[tuple[str, str]]:
+        if latency_in_s > 0:
+            time.sleep(latency_in_s)
+        return jobs
+
+    scraper_class = type(name, (AbstractScraper,), {
+        "__module__": f"synthetic.{name}",
+        "scrape_open_jobs": scrape_open_jobs
+    })
+
+    return scraper_class()
+
+
+def create_storage(backend: str, known_jobs: set[tuple[str, str]], keywords: set[str]):
+    """
+    Creates a storage file in the current directory with
+    the given backend, known jobs and keywords.
+    """
+
+    # Remove the storage file and every backend's files
+    # (database, WAL and known jobs), so no run starts
+    # with the jobs of the previous one already known
+    for pattern in ("storage.*", fingerprints_file_name + "*"):
+        for path in Path(".").glob(pattern):
+            path.unlink()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        try:
+            Storage()
+        except Exception:
+            # Expected, a default storage file was just created
+            pass
+
+        storage = Storage()
+        storage._storage.storage_backend = backend
+        storage.update_storage_file()
+
+        storage = Storage()
+        for keyword in keywords:
+            storage.add_keyword(keyword)
+
+        storage.replace_known_jobs_partition("benchmark", known_jobs)
+
+        # Write it now, rather than in the background
+        storage.release()
+
+# ---------- MEASUREMENT ----------
+
+
+def measure(function: Callable[[], None], setup: Callable[[], None] | None, repeats: int) -> dict:
+    """
+    Runs the function repeats times and returns the
+    timings, plus the peak memory of one more run.
+    """
+
+    timings = []
+
+    for _ in range(repeats):
+        if setup is not None:
+            setup()
+
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+
+    if setup is not None:
+        setup()
+
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "min_s": min(timings),
+        "median_s": statistics.median(timings),
+        "max_s": max(timings),
+        "peak_memory_bytes": peak
+    }
+
+
+def run_benchmark(results: list, name: str, params: dict, function, setup=None, repeats: int = 3):
+    label = ", ".join(f"{key}={value}" for key, value in params.items())
+    print(f"{name} ({label})...", end=" ", flush=True)
+
+    # Keep the pipeline's own logging out of the output
+    with contextlib.redirect_stdout(io.StringIO()):
+        measurement = measure(function, setup, repeats)
+
+    print(f"{measurement['median_s'] * 1000:.1f} ms, {measurement['peak_memory_bytes'] / 1024:.0f} KiB peak")
+    results.append({"benchmark": name, "params": params, **measurement})
+
+# ---------- BENCHMARKS ----------
+
+
+def bench_filter_jobs_with_keywords(results: list, repeats: int):
+    for num_keywords in keyword_counts:
+        keywords = make_keywords(num_keywords, 2)
+
+        run_benchmark(
+            results, "compile_keyword_matcher",
+            {"keywords": num_keywords},
+            lambda: KeywordMatcher(keywords),
+            repeats=repeats
+        )
+
+    for num_jobs in [1_000, 10_000]:
+        jobs = make_jobs(num_jobs, "filter", 1)
+
+        for num_keywords in keyword_counts:
+            matcher = KeywordMatcher(make_keywords(num_keywords, 2))
+
+            run_benchmark(
+                results, "filter_jobs_with_keywords",
+                {"jobs": num_jobs, "keywords": num_keywords},
+                lambda: filter_jobs_with_keywords(jobs, matcher),
+                repeats=repeats
+            )
+
+
+def bench_storage(results: list, known_jobs_sizes: list[int], repeats: int):
+    for backend in [backend_json, backend_sqlite, backend_fingerprint]:
+        for size in known_jobs_sizes:
+            known_jobs = make_jobs(size, "storage", 3)
+            create_storage(backend, known_jobs, make_keywords(100, 4))
+
+            run_benchmark(
+                results, "storage_load",
+                {"backend": backend, "known_jobs": size},
+                lambda: Storage().release(),
+                repeats=repeats
+            )
+
+            # Alternate between two sets of known jobs which
+            # differ by 1% either way, so every run is a change
+            num_changed = max(1, size // 100)
+            changed_jobs = set(sorted(known_jobs)[num_changed:]) | make_jobs(num_changed, "changed", 7)
+            variants = [changed_jobs, known_jobs]
+            opened = []
+
+            def open_storage():
+                opened.append(Storage())
+
+            def save_known_jobs():
+                # Replace the partition and write it, the way a
+                # check does, but without the scraping
+                storage = opened.pop()
+                storage.replace_known_jobs_partition("benchmark", variants[0])
+                storage.release()
+                variants.reverse()
+
+            run_benchmark(
+                results, "save_known_jobs",
+                {"backend": backend, "known_jobs": size},
+                save_known_jobs,
+                setup=open_storage,
+                repeats=repeats
+            )
+
+
+def check_and_close(scrapers: set[AbstractScraper], opened: list[Storage]):
+    """Runs a check on opened storage, and waits for it to be written."""
+
+    storage = opened.pop()
+    new_jobs_check(scrapers, storage)
+    storage.release()
+
+
+def bench_new_jobs_check(results: list, known_jobs_sizes: list[int], configurations: list[tuple], repeats: int):
+    for backend in [backend_json, backend_sqlite, backend_fingerprint]:
+        for size in known_jobs_sizes:
+            if size > max_check_known_jobs:
+                continue
+
+            for num_scrapers, latency_in_s, jobs_per_scraper in configurations:
+                for num_keywords in [0, 100]:
+                    # Most jobs are already known, a few are new
+                    scrapers = set()
+                    for i in range(num_scrapers):
+                        jobs = make_jobs(jobs_per_scraper, f"scraper{i}", 10 + i)
+                        scrapers.add(make_synthetic_scraper(f"synthetic{i}", latency_in_s, jobs))
+
+                    known_jobs = make_jobs(size, "known", 5)
+                    keywords = make_keywords(num_keywords, 6)
+
+                    # Every run starts from the same storage, which
+                    # is loaded before the check is timed
+                    opened = []
+
+                    def setup():
+                        create_storage(backend, known_jobs, keywords)
+                        opened.append(Storage())
+
+                    run_benchmark(
+                        results, "new_jobs_check",
+                        {
+                            "backend": backend,
+                            "known_jobs": size,
+                            "scrapers": num_scrapers,
+                            "latency_s": latency_in_s,
+                            "jobs_per_scraper": jobs_per_scraper,
+                            "keywords": num_keywords
+                        },
+                        lambda: check_and_close(scrapers, opened),
+                        setup=setup,
+                        repeats=repeats
+                    )
+
+# ---------- REPORTING ----------
+
+
+def get_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=repository_path, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def get_key(result: dict) -> str:
+    return result["benchmark"] + json.dumps(result["params"], sort_keys=True)
+
+
+def compare(results: list, baseline_path: str) -> int:
+    """
+    Prints how every benchmark changed relative to the
+    baseline results.
+
+    :return: The number of regressions.
+    """
+
+    file = open(baseline_path, "r")
+    baseline = json.loads(file.read())
+    file.close()
+
+    baseline_results = {get_key(result): result for result in baseline["results"]}
+    regressions = 0
+
+    print(f"\nCompared with {baseline.get('revision')}:")
+
+    for result in results:
+        old = baseline_results.get(get_key(result))
+        if old is None or old["median_s"] == 0:
+            continue
+
+        ratio = result["median_s"] / old["median_s"]
+        flag = ""
+        if ratio > regression_threshold:
+            flag = " REGRESSION"
+            regressions += 1
+
+        label = ", ".join(f"{key}={value}" for key, value in result["params"].items())
+        print(f"{result['benchmark']} ({label}): {ratio:.2f}x{flag}")
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks the JobSpotBot check pipeline.")
+    parser.add_argument("--output", help="Write results to this JSON file.")
+    parser.add_argument("--compare", help="Compare results with this earlier JSON file.")
+    parser.add_argument("--repeats", type=int, default=3, help="Timed runs of each benchmark.")
+    parser.add_argument("--quick", action="store_true", help="Skip the largest sets and slowest checks.")
+    parser.add_argument(
+        "--only",
+        choices=["filter", "storage", "check"],
+        action="append",
+        help="Only run these benchmarks (can be repeated)."
+    )
+    args = parser.parse_args()
+
+    known_jobs_sizes = quick_known_jobs_sizes if args.quick else default_known_jobs_sizes
+    configurations = quick_scraper_configurations if args.quick else scraper_configurations
+    selected = set(args.only or ["filter", "storage", "check"])
+    output_path = None if args.output is None else os.path.abspath(args.output)
+    compare_path = None if args.compare is None else os.path.abspath(args.compare)
+
+    results = []
+    working_directory = os.getcwd()
+
+    with tempfile.TemporaryDirectory(prefix="jobspotbot-bench-") as directory:
+        os.chdir(directory)
+
+        try:
+            if "filter" in selected:
+                bench_filter_jobs_with_keywords(results, args.repeats)
+            if "storage" in selected:
+                bench_storage(results, known_jobs_sizes, args.repeats)
+            if "check" in selected:
+                bench_new_jobs_check(results, known_jobs_sizes, configurations, args.repeats)
+        finally:
+            os.chdir(working_directory)
+
+    report = {
+        "revision": get_revision(),
+        "timestamp": datetime.datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeats": args.repeats,
+        "results": results
+    }
+
+    if output_path is not None:
+        file = open(output_path, "w")
+        file.write(json.dumps(report, indent=2))
+        file.close()
+        print(f"Wrote {len(results)} results to {output_path}")
+
+    if compare_path is not None and compare(results, compare_path) > 0:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
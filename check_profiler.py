@@ -0,0 +1,309 @@
+"""
+Check Profiler | Written by Joshua Sheldon
+
+Profiles checks for new jobs on demand, so a check
+which suddenly takes minutes can be looked into
+without restarting the bot under a profiler. Once
+armed (by /profile, or by sending the bot SIGUSR1),
+the next few checks are profiled with cProfile, and
+the memory they allocate is traced with tracemalloc.
+
+Every profiled check gets its own directory under
+"profiles/", holding a CPU profile of the whole check
+(check.prof), one for each scraper which ran on a
+thread (scraper-<name>.prof), a snapshot of the memory
+allocated during the check which was still in use at
+the end (allocations.snapshot), and a short summary
+(summary.txt). Only the newest directories are kept.
+Profiles can be read with pstats or snakeviz, and
+snapshots with tracemalloc.Snapshot.load().
+
+Scrapers which run in worker processes or on the
+async scraper event loop aren't profiled on their own.
+"""
+
+# ---------- IMPORTS ----------
+
+# Python Default Imports
+import contextlib
+import cProfile
+import datetime
+import os
+import pstats
+import re
+import shutil
+from threading import Lock
+import time
+import tracemalloc
+from typing import Callable, Iterator
+
+# ---------- CONSTANTS ----------
+
+profiles_dir_name = "profiles"
+
+# Most profiled checks kept, the oldest are deleted
+max_profile_runs = 10
+
+# Most checks profiled from a single request
+max_profiled_checks = 10
+
+# Functions and allocation sites listed in summaries
+summary_length = 10
+
+# Frames of the call stack kept for each allocation
+traceback_depth = 10
+
+# ---------- CLASSES & METHODS ----------
+
+
+def format_size(size_in_bytes: float) -> str:
+    for unit in ("B", "KiB", "MiB"):
+        if abs(size_in_bytes) < 1024:
+            return f"{size_in_bytes:.1f} {unit}"
+        size_in_bytes /= 1024
+
+    return f"{size_in_bytes:.1f} GiB"
+
+
+def get_cpu_summary(profile: cProfile.Profile) -> list[str]:
+    """Lists the functions which took the most time, including the functions they called."""
+
+    stats = pstats.Stats(profile)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE)
+
+    lines = []
+    for function in stats.fcn_list[:summary_length]:
+        file_name, line_number, function_name = function
+        num_primitive_calls, num_calls, total_time, cumulative_time, callers = stats.stats[function]
+
+        # Builtins have no file, ex. ("~", 0, "<built-in method time.sleep>")
+        location = function_name
+        if file_name != "~":
+            location = f"{os.path.basename(file_name)}:{line_number}({function_name})"
+
+        lines.append(f"{cumulative_time:8.3f}s {num_calls:>8} calls  {location}")
+
+    return lines
+
+
+def get_memory_summary(snapshot: tracemalloc.Snapshot) -> list[str]:
+    """Lists the lines which allocated the most memory that's still in use."""
+
+    snapshot = snapshot.filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>")
+    ))
+
+    lines = []
+    for statistic in snapshot.statistics("lineno")[:summary_length]:
+        frame = statistic.traceback[0]
+        lines.append(
+            f"{format_size(statistic.size):>10} {statistic.count:>8} blocks  "
+            f"{os.path.basename(frame.filename)}:{frame.lineno}"
+        )
+
+    return lines
+
+
+class CheckProfiler:
+    """
+    Profiles the next few checks once armed with request().
+    Wrap every check in profile_check(), and every scraper
+    in profile_scraper().
+    """
+
+    # Instance Variables
+    _lock: Lock
+    _path: str
+    _num_remaining_checks: int
+    _listeners: list[list]
+    _run_path: str | None
+
+    def __init__(self, path: str = profiles_dir_name):
+        self._lock = Lock()
+        self._path = path
+        self._num_remaining_checks = 0
+
+        # Callbacks which are given the summary of each of
+        # the next few profiled checks, with how many more
+        # summaries each is waiting for
+        self._listeners = []
+
+        # The directory of the check being profiled
+        self._run_path = None
+
+    def request(self, num_checks: int, on_summary: Callable[[str], None] | None = None):
+        """
+        Profiles the next checks, on top of any already
+        requested.
+
+        :param num_checks: How many checks to profile.
+        :param on_summary: If given, called with the summary of
+                           each of those checks, on the thread
+                           which ran the check.
+        """
+
+        num_checks = max(1, min(num_checks, max_profiled_checks))
+
+        with self._lock:
+            self._num_remaining_checks = max(self._num_remaining_checks, num_checks)
+
+            if on_summary is not None:
+                self._listeners.append([on_summary, num_checks])
+
+        print(f"Profiling the next {num_checks} check(s).")
+
+    def is_armed(self) -> bool:
+        with self._lock:
+            return self._num_remaining_checks > 0
+
+    def _create_run_path(self) -> str:
+        """Creates the directory of a new profiled check, deleting the oldest ones."""
+
+        os.makedirs(self._path, exist_ok=True)
+
+        runs = sorted(name for name in os.listdir(self._path) if name.startswith("check-"))
+        for name in runs[:max(0, len(runs) - max_profile_runs + 1)]:
+            shutil.rmtree(os.path.join(self._path, name), ignore_errors=True)
+
+        run_path = os.path.join(self._path, datetime.datetime.now().strftime("check-%Y%m%d-%H%M%S-%f"))
+        os.makedirs(run_path)
+        return run_path
+
+    @contextlib.contextmanager
+    def profile_check(self) -> Iterator[None]:
+        """Profiles the check run inside of it, if the profiler is armed."""
+
+        with self._lock:
+            is_armed = self._num_remaining_checks > 0
+
+            listeners = []
+            if is_armed:
+                self._num_remaining_checks -= 1
+
+                for listener in self._listeners:
+                    listeners.append(listener[0])
+                    listener[1] -= 1
+
+                self._listeners = [listener for listener in self._listeners if listener[1] > 0]
+
+        if not is_armed:
+            yield
+            return
+
+        try:
+            run_path = self._create_run_path()
+        except OSError as e:
+            print(f"Failed to create a directory for the check profile: {e}")
+            yield
+            return
+
+        # Something else may be tracing memory already
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(traceback_depth)
+        tracemalloc.reset_peak()
+
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError as e:
+            # Another profiler is already active
+            print(f"Failed to profile the check: {e}")
+            if started_tracing:
+                tracemalloc.stop()
+            yield
+            return
+
+        self._run_path = run_path
+        start = time.monotonic()
+
+        try:
+            yield
+        finally:
+            profile.disable()
+            duration = time.monotonic() - start
+            self._run_path = None
+
+            snapshot = tracemalloc.take_snapshot()
+            traced_memory, peak_memory = tracemalloc.get_traced_memory()
+            if started_tracing:
+                tracemalloc.stop()
+
+            summary = "\n".join([
+                f"Check took {duration:.1f}s, profiled in {run_path}",
+                "",
+                "Slowest functions (cumulative):",
+                *get_cpu_summary(profile),
+                "",
+                f"Memory still in use (traced: {format_size(traced_memory)}, peak: {format_size(peak_memory)}):",
+                *get_memory_summary(snapshot)
+            ])
+
+            try:
+                profile.dump_stats(os.path.join(run_path, "check.prof"))
+                snapshot.dump(os.path.join(run_path, "allocations.snapshot"))
+
+                file = open(os.path.join(run_path, "summary.txt"), "w")
+                file.write(summary + "\n")
+                file.close()
+            except OSError as e:
+                print(f"Failed to write the check profile: {e}")
+
+            print(summary)
+
+            for listener in listeners:
+                try:
+                    listener(summary)
+                except Exception as e:
+                    print(f"Failed to send the check profile summary: {e}")
+
+    @contextlib.contextmanager
+    def profile_scraper(self, name: str) -> Iterator[None]:
+        """
+        Profiles a scraper which runs on the current thread,
+        if the check it's part of is being profiled.
+        """
+
+        run_path = self._run_path
+        if run_path is None:
+            yield
+            return
+
+        # Only one profiler can be active at a time from
+        # Python 3.12 on, the scraper is still timed
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            yield
+            return
+
+        try:
+            yield
+        finally:
+            profile.disable()
+
+            file_name = "scraper-" + re.sub(r"[^\w.-]", "_", name) + ".prof"
+            try:
+                profile.dump_stats(os.path.join(run_path, file_name))
+            except OSError as e:
+                print(f"Failed to write the profile of {name}: {e}")
+
+
+_profiler: CheckProfiler | None = None
+_profiler_lock = Lock()
+
+
+def get_check_profiler() -> CheckProfiler:
+    """Returns the shared CheckProfiler, creating it the first time it's needed."""
+
+    global _profiler
+
+    with _profiler_lock:
+        if _profiler is None:
+            _profiler = CheckProfiler()
+
+        return _profiler
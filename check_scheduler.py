@@ -0,0 +1,211 @@
+"""
+Check Scheduler | Written by Joshua Sheldon
+
+Schedules checks for new jobs on an event loop. Every
+scraper is checked at its own interval, start times
+are jittered so job boards aren't all hit at the same
+moment, and scrapers which fail are backed off
+exponentially. Runs which were missed (ex. while the
+machine was asleep) are coalesced into a single run.
+With adaptive polling, each scraper's interval follows
+how often its job board posts new jobs (see
+adaptive_polling.py).
+"""
+
+# ---------- IMPORTS ----------
+
+# Python Default Imports
+import asyncio
+from concurrent.futures import Future
+import datetime
+import random
+from typing import Callable
+
+# Local Imports
+from abstract_scraper import AbstractScraper
+from adaptive_polling import PostingRateModel
+from jobs_check import CheckResult
+from scraper_runner import get_scraper_name, outcome_skipped
+
+# ---------- CONSTANTS ----------
+
+# Every delay is randomly stretched or shrunk by
+# up to this fraction of itself
+jitter_fraction = 0.1
+
+# Longest delay between runs of a failing scraper
+max_backoff_in_s = 6 * 60 * 60
+
+# Longest time the scheduler sleeps before looking
+# for new scrapers
+max_sleep_in_s = 60
+
+# ---------- CLASSES ----------
+
+
+class CheckScheduler:
+    """
+    Decides when each scraper should next be run, and
+    runs all scrapers which are due together through
+    the given run_check function.
+    """
+
+    _scrapers: set[AbstractScraper]
+    _default_interval_in_s: int
+    _run_check: Callable[[frozenset], Future]
+    _next_runs: dict[AbstractScraper, float]
+    _failures: dict[AbstractScraper, int]
+    _rate_model: PostingRateModel | None
+
+    def __init__(
+            self,
+            scrapers: set[AbstractScraper],
+            default_interval_in_s: int,
+            run_check: Callable[[frozenset], Future],
+            rate_model: PostingRateModel | None = None
+    ):
+        """
+        :param scrapers: The scrapers to schedule. Scrapers
+                         added to or removed from this set
+                         later are picked up automatically.
+        :param default_interval_in_s: The interval used for
+                                      scrapers which don't
+                                      define their own.
+        :param run_check: Given a frozenset of scrapers, starts
+                          a check with only those scrapers and
+                          returns a future for its CheckResult.
+        :param rate_model: If given, intervals adapt to how
+                           often each job board posts new jobs,
+                           starting from the regular interval.
+        """
+        self._scrapers = scrapers
+        self._default_interval_in_s = default_interval_in_s
+        self._run_check = run_check
+        self._next_runs = dict()
+        self._failures = dict()
+        self._rate_model = rate_model
+
+    def get_base_interval_in_s(self, scraper: AbstractScraper) -> float:
+        interval = scraper.check_interval_in_s
+
+        if interval is None:
+            return self._default_interval_in_s
+
+        return interval
+
+    def get_interval_in_s(self, scraper: AbstractScraper) -> float:
+        interval = self.get_base_interval_in_s(scraper)
+
+        if self._rate_model is not None:
+            interval = self._rate_model.get_interval_in_s(
+                get_scraper_name(scraper), interval, datetime.datetime.now()
+            )
+
+        return interval
+
+    def _get_delay_in_s(self, scraper: AbstractScraper) -> float:
+        """
+        Returns how long to wait before running the scraper
+        again. Doubles with every consecutive failure.
+        """
+
+        delay = self.get_interval_in_s(scraper)
+        failures = self._failures.get(scraper, 0)
+
+        if failures > 0:
+            delay = max(delay, min(delay * (2 ** failures), max_backoff_in_s))
+
+        return delay * random.uniform(1 - jitter_fraction, 1 + jitter_fraction)
+
+    def _sync_scrapers(self, now: float):
+        """
+        Schedules scrapers which haven't been seen before at
+        a random point within their first interval, and
+        forgets scrapers which are gone.
+        """
+
+        scrapers = set(self._scrapers)
+
+        for scraper in scrapers:
+            if scraper not in self._next_runs:
+                self._next_runs[scraper] = now + random.uniform(0, self.get_interval_in_s(scraper))
+
+        for scraper in list(self._next_runs):
+            if scraper not in scrapers:
+                del self._next_runs[scraper]
+                self._failures.pop(scraper, None)
+
+    def _record_check(self, due: frozenset, result: CheckResult | None, now: float) -> bool:
+        """
+        Schedules the next run of every scraper which was
+        just run. Scrapers are always scheduled relative to
+        when the check finished, so however late a check
+        was, each scraper only runs once to catch up.
+
+        :return: True if posting rates were recorded, and
+                 should be saved.
+        """
+
+        succeeded = dict()
+        skipped = set()
+        if result is not None:
+            for scraper_result in result.scraper_results:
+                if scraper_result.is_ok():
+                    succeeded[scraper_result.name] = scraper_result
+                elif scraper_result.outcome == outcome_skipped:
+                    skipped.add(scraper_result.name)
+
+        for scraper in due:
+            name = get_scraper_name(scraper)
+            scraper_result = succeeded.get(name)
+
+            if scraper_result is not None:
+                self._failures[scraper] = 0
+
+                if self._rate_model is not None:
+                    self._rate_model.record_check(
+                        scraper_result.name,
+                        scraper_result.num_new_jobs,
+                        datetime.datetime.now(),
+                        self.get_base_interval_in_s(scraper)
+                    )
+            elif name not in skipped:
+                # Skipped scrapers are already backed off by
+                # their circuit breaker (see scraper_health.py)
+                self._failures[scraper] = self._failures.get(scraper, 0) + 1
+
+            if scraper in self._next_runs:
+                self._next_runs[scraper] = now + self._get_delay_in_s(scraper)
+
+        return self._rate_model is not None and len(succeeded) > 0
+
+    async def run(self):
+        """Runs checks forever. Start it as a task on the event loop."""
+
+        loop = asyncio.get_running_loop()
+
+        while True:
+            now = loop.time()
+            self._sync_scrapers(now)
+
+            due = frozenset(scraper for scraper, next_run in self._next_runs.items() if next_run <= now)
+
+            if len(due) > 0:
+                result = None
+
+                try:
+                    result = await asyncio.wrap_future(self._run_check(due))
+                except Exception as e:
+                    print(f"Scheduled check failed: {e}")
+
+                if self._record_check(due, result, loop.time()):
+                    # Don't block the event loop on the write
+                    try:
+                        await asyncio.to_thread(self._rate_model.save)
+                    except Exception as e:
+                        print(f"Failed to save posting rates: {e}")
+
+                continue
+
+            next_run = min(self._next_runs.values(), default=now + max_sleep_in_s)
+            await asyncio.sleep(min(next_run - now, max_sleep_in_s))
@@ -10,7 +10,10 @@ users that new jobs have been found.
 # ---------- IMPORTS ----------
 
 # Python Default Imports
+import asyncio
+from concurrent.futures import Future
 import datetime
+import time
 
 # Pip Sourced Imports
 import disnake
@@ -18,12 +21,51 @@ from disnake.ext import commands
 
 # Local Imports
 from abstract_scraper import AbstractScraper
-from jobs_check import new_jobs_check
+from check_profiler import get_check_profiler, max_profiled_checks
+from embed_packing import embed_title, format_job, pack_jobs
+from job_router import JobRouter, scope_channel, scope_guild
+from jobs_check import CheckResult, run_jobs_check
+import metrics
+from notification_outbox import NotificationOutbox, OutboxEntry, outbox_file_name
 from persistent_storage import Storage
+from scraper_health import get_health_tracker, state_closed, state_half_open, state_open
+from single_flight import SingleFlight
 
 # ---------- CONSTANTS ----------
 
 check_emote = ":white_check_mark:"
+warning_emote = ":warning:"
+
+# Most scrapers listed by /stats and /health
+max_stats_scrapers = 20
+
+# Longest error message shown by /health
+max_error_length = 100
+
+# Longest profile summary posted by /profile
+max_summary_length = 4000
+
+# Keywords added without a scope filter jobs for
+# every channel without subscriptions
+scope_global = "global"
+keyword_scopes = [scope_global, scope_guild, scope_channel]
+
+# Most outbox entries delivered at once
+delivery_batch_size = 500
+
+# Most channels sent messages at the same time. disnake
+# waits out Discord's rate limits for each channel, this
+# keeps a big burst well under the global rate limit.
+max_concurrent_sends = 5
+
+# Longest time the delivery worker sleeps before
+# checking the outbox, even if nothing woke it
+max_delivery_sleep_in_s = 60
+
+# How long the delivery worker waits after failing to
+# deliver, so an entry which always fails can't make it
+# spin without pausing
+delivery_error_sleep_in_s = 5
 
 # ---------- CLASSES ----------
 
@@ -38,11 +80,65 @@ class DiscordInterface:
     bot: commands.InteractionBot
     _scrapers: set[AbstractScraper]
     _storage: Storage
+    _check_flight: SingleFlight
+    _outbox: NotificationOutbox
+    _outbox_filled: asyncio.Event
+    _channels: dict[int, disnake.abc.Messageable]
 
     def __init__(self, scrapers: set[AbstractScraper], storage: Storage):
         self.bot = commands.InteractionBot(test_guilds=storage.get_active_guilds())
         self._scrapers = scrapers
         self._storage = storage
+        self._check_flight = SingleFlight(self._check_and_notify, "jobs-check")
+        self._outbox = NotificationOutbox(outbox_file_name)
+        self._outbox_filled = asyncio.Event()
+        self._channels = dict()
+
+    def _check_and_notify(self, scrapers: frozenset | None, notify: bool = True) -> CheckResult:
+        """
+        Retrieves all new (and potentially filtered) jobs, and
+        queues them in the outbox to be sent to Discord (see
+        deliver_notifications()), unless notify is False. Runs
+        on the check thread, never on the bot's event loop.
+        """
+        if scrapers is None:
+            scrapers = set(self._scrapers)
+
+        if not notify:
+            return run_jobs_check(scrapers, self._storage)
+
+        result = run_jobs_check(scrapers, self._storage, self._outbox)
+
+        # If new jobs exist, wake up the delivery worker
+        if len(result.unfiltered_new_jobs) > 0:
+            self.bot.loop.call_soon_threadsafe(self._outbox_filled.set)
+
+        return result
+
+    def run_check(self, scrapers: frozenset | None = None) -> Future:
+        """
+        Starts a check for new jobs in the background, and
+        notifies everyone of any new jobs. If a check with the
+        same scrapers is already running, no new check is
+        started, and the future of the running check is
+        returned instead. Checks never run at the same time.
+
+        :param scrapers: The scrapers to check with, or None
+                         to check with every scraper.
+        :return: A future which resolves to the CheckResult.
+        """
+        return self._check_flight.run(scrapers)
+
+    def fill_known_jobs(self) -> Future:
+        """
+        Starts a check with every scraper which only fills in
+        the known jobs, without notifying anyone, for when
+        there are no known jobs yet. Runs in line with other
+        checks, like run_check().
+
+        :return: A future which resolves to the CheckResult.
+        """
+        return self._check_flight.run(None, False)
 
     async def start_bot(self):
         # /check
@@ -50,11 +146,16 @@ class DiscordInterface:
             description="Manually starts a check for new jobs."
         )
         async def check(inter: disnake.ApplicationCommandInteraction):
-            new_jobs = new_jobs_check(self._scrapers, self._storage)
+            # Checks can take a while, so acknowledge the
+            # command and wait for the check off the loop
+            await inter.response.defer()
 
-            # If new jobs exist, notify everyone on Discord
-            if len(new_jobs) > 0:
-                await self.do_new_jobs_notif(new_jobs)
+            try:
+                await asyncio.wrap_future(self.run_check())
+            except Exception as e:
+                print(f"Exception in /check: {e}")
+                await inter.followup.send(f"{warning_emote} Failed to check for new jobs: {e}")
+                return
 
             await inter.send(f"{check_emote} Successfully checked for new jobs!")
 
@@ -70,12 +171,29 @@ class DiscordInterface:
         @keywords.sub_command(
             description="Add keyword of interest for job titles."
         )
-        async def add(inter: disnake.ApplicationCommandInteraction, keyword: str):
+        async def add(
+                inter: disnake.ApplicationCommandInteraction,
+                keyword: str,
+                scope: str = commands.Param(
+                    default=scope_global,
+                    choices=keyword_scopes,
+                    description="Subscribe only this server or channel to the keyword."
+                )
+        ):
+
+            if scope == scope_global:
+                was_added = self._storage.add_keyword(keyword)
+            else:
+                scope_id = self.get_scope_id(inter, scope)
 
-            was_added = self._storage.add_keyword(keyword)
+                if scope_id is None:
+                    await inter.send(f"{warning_emote} The {scope} scope can only be used in a server!", ephemeral=True)
+                    return
+
+                was_added = self._storage.add_subscription(scope, scope_id, keyword)
 
             if was_added:
-                response = f"Added keyword: `{keyword}`"
+                response = f"Added keyword: `{keyword}` ({scope})"
             else:
                 response = f"Keyword (`{keyword}`) is already active!"
 
@@ -85,12 +203,29 @@ class DiscordInterface:
         @keywords.sub_command(
             description="Deletes a keyword of interest for job titles."
         )
-        async def delete(inter: disnake.ApplicationCommandInteraction, keyword: str):
+        async def delete(
+                inter: disnake.ApplicationCommandInteraction,
+                keyword: str,
+                scope: str = commands.Param(
+                    default=scope_global,
+                    choices=keyword_scopes,
+                    description="Unsubscribe only this server or channel from the keyword."
+                )
+        ):
+
+            if scope == scope_global:
+                was_deleted = self._storage.del_keyword(keyword)
+            else:
+                scope_id = self.get_scope_id(inter, scope)
 
-            was_deleted = self._storage.del_keyword(keyword)
+                if scope_id is None:
+                    await inter.send(f"{warning_emote} The {scope} scope can only be used in a server!", ephemeral=True)
+                    return
+
+                was_deleted = self._storage.del_subscription(scope, scope_id, keyword)
 
             if was_deleted:
-                response = f"Deleted keyword: `{keyword}`"
+                response = f"Deleted keyword: `{keyword}` ({scope})"
             else:
                 response = f"Keyword (`{keyword}`) not found!"
 
@@ -101,15 +236,29 @@ class DiscordInterface:
             description="Lists all keywords of interest for job titles."
         )
         async def list(inter: disnake.ApplicationCommandInteraction):
-            keywords = self._storage.get_keywords()
+            sections = []
+
+            for scope in keyword_scopes:
+                if scope == scope_global:
+                    keywords = self._storage.get_keywords()
+                else:
+                    scope_id = self.get_scope_id(inter, scope)
+                    keywords = {
+                        keyword for subscription_scope, subscription_scope_id, keyword
+                        in self._storage.get_subscriptions()
+                        if subscription_scope == scope and subscription_scope_id == scope_id
+                    }
+
+                if len(keywords) > 0:
+                    keywords_as_text = [f"**{scope.capitalize()}**"]
 
-            if len(keywords) > 0:
-                keywords_as_text = []
+                    for keyword in sorted(keywords):
+                        keywords_as_text.append(f"- {keyword}")
 
-                for keyword in keywords:
-                    keywords_as_text.append(f"- {keyword}")
+                    sections.append("\n".join(keywords_as_text))
 
-                description = "\n".join(keywords_as_text)
+            if len(sections) > 0:
+                description = "\n\n".join(sections)
             else:
                 description = "No active keywords!"
 
@@ -122,37 +271,363 @@ class DiscordInterface:
 
             await inter.send(embed=embed)
 
+        # /stats
+        @self.bot.slash_command(
+            description="Shows how long each scraper takes, and how often it fails."
+        )
+        async def stats(inter: disnake.ApplicationCommandInteraction):
+            embed = disnake.Embed(
+                title="Scraper Stats",
+                description=self.get_stats_description(),
+                colour=self._storage.get_colour(),
+                timestamp=datetime.datetime.now()
+            )
+
+            await inter.send(embed=embed)
+
+        # /health
+        @self.bot.slash_command(
+            description="Shows which scrapers are failing, and which are being skipped."
+        )
+        async def health(inter: disnake.ApplicationCommandInteraction):
+            embed = disnake.Embed(
+                title="Scraper Health",
+                description=self.get_health_description(),
+                colour=self._storage.get_colour(),
+                timestamp=datetime.datetime.now()
+            )
+
+            await inter.send(embed=embed)
+
+        # /profile
+        @self.bot.slash_command(
+            description="Profiles the next checks, and posts a summary of each.",
+            default_member_permissions=disnake.Permissions(administrator=True)
+        )
+        async def profile(
+                inter: disnake.ApplicationCommandInteraction,
+                checks: int = commands.Param(
+                    default=1,
+                    ge=1,
+                    le=max_profiled_checks,
+                    description="How many checks to profile."
+                ),
+                check_now: bool = commands.Param(
+                    default=True,
+                    description="Start a check right away, instead of waiting for the next scheduled one."
+                )
+        ):
+            channel_id = inter.channel_id
+
+            # Summaries are made on the check thread
+            def on_summary(summary: str):
+                asyncio.run_coroutine_threadsafe(self.send_profile_summary(channel_id, summary), self.bot.loop)
+
+            get_check_profiler().request(checks, on_summary)
+            await inter.send(f"{check_emote} Profiling the next {checks} check(s), summaries will be posted here.")
+
+            if check_now:
+                self.run_check()
+
         await self.bot.start(self._storage.get_bot_token())
 
-    async def do_new_jobs_notif(self, new_jobs: set[tuple[str, str]]):
+    @staticmethod
+    def get_scope_id(inter: disnake.ApplicationCommandInteraction, scope: str) -> int | None:
         """
-        Given a set of new jobs, sends a message to each active
-        channel that new jobs have been posted, with the list
-        of new jobs.
+        Returns the ID of the guild or channel the command was
+        used in, or None for the guild scope in a DM.
+        """
+
+        if scope == scope_guild:
+            return inter.guild_id
+
+        return inter.channel_id
 
-        :param new_jobs: A set of jobs represented by tuples. The first
-                         element of each tuple is the job's name, and
-                         the second element of each tuple is the job's
-                         link.
+    def get_stats_description(self) -> str:
         """
+        Summarizes the metrics recorded since the bot started,
+        with the scrapers which took the most time in total
+        listed first.
+        """
+
+        check_time, check_count = metrics.check_duration.get_sum_and_count()
+
+        if check_count == 0:
+            return "No checks have run yet!"
 
-        jobs_as_text = []
+        lines = [f"**{check_count}** check(s), **{check_time / check_count:.2f}s** on average.", ""]
 
-        for job in new_jobs:
-            jobs_as_text.append(f"- [{job[0]}]({job[1]})")
+        scrapers = []
+        for (name,) in metrics.scraper_duration.get_label_values():
+            total, count = metrics.scraper_duration.get_sum_and_count(name)
+            scrapers.append((total, count, name))
 
-        description = "\n".join(jobs_as_text)
+        scrapers.sort(reverse=True)
+
+        for total, count, name in scrapers[:max_stats_scrapers]:
+            failures = count - metrics.scraper_runs.get(name, "ok")
+            jobs = int(metrics.scraper_jobs_returned.get(name))
+            lines.append(
+                f"- `{name}`: {total / count:.2f}s avg, {total:.1f}s total, "
+                f"{failures}/{count} failed, {jobs} job(s)"
+            )
+
+        write_time, write_count = metrics.storage_write_duration.get_sum_and_count()
+        if write_count > 0:
+            lines.append("")
+            lines.append(
+                f"Storage: {write_count} write(s), {write_time / write_count * 1000:.0f}ms avg, "
+                f"{metrics.storage_write_bytes.get() / 1024:.0f} KiB total"
+            )
+
+        send_time, send_count = metrics.notification_send_duration.get_sum_and_count()
+        if send_count > 0:
+            lines.append(
+                f"Notifications: {send_count} sent, {send_time / send_count * 1000:.0f}ms avg, "
+                f"{int(metrics.notification_failures.get())} failed"
+            )
+
+        return "\n".join(lines)
+
+    @staticmethod
+    def get_health_description() -> str:
+        """
+        Summarizes the health of every scraper (see
+        scraper_health.py), with the least healthy
+        scrapers listed first.
+        """
+
+        scrapers = get_health_tracker().get_health()
+
+        if len(scrapers) == 0:
+            return "No scrapers have run yet!"
+
+        scrapers.sort(key=lambda health: (health.state == state_closed, -health.consecutive_failures, health.name))
+        lines = []
+
+        for health in scrapers[:max_stats_scrapers]:
+            emote = check_emote if health.state == state_closed else warning_emote
+            line = f"{emote} `{health.name}`: {health.latency_ewma_in_s:.2f}s avg"
+
+            if health.last_success_at is None:
+                line += ", never succeeded"
+            else:
+                line += f", last succeeded <t:{int(health.last_success_at)}:R>"
+
+            if health.consecutive_failures > 0:
+                line += f", {health.consecutive_failures} failure(s) in a row ({health.last_error[:max_error_length]})"
+
+            if health.state == state_open:
+                line += f", skipped until <t:{int(health.open_until)}:R>"
+            elif health.state == state_half_open:
+                line += ", being probed"
+
+            lines.append(line)
+
+        return "\n".join(lines)
+
+    async def send_profile_summary(self, channel_id: int, summary: str):
+        """Posts the summary of a profiled check (see check_profiler.py)."""
+
+        if len(summary) > max_summary_length:
+            summary = summary[:max_summary_length - 3] + "..."
 
         embed = disnake.Embed(
-            title="NEW JOBS FOUND",
-            description=description,
+            title="Check Profile",
+            description=f"```\n{summary}\n```",
             colour=self._storage.get_colour(),
             timestamp=datetime.datetime.now()
         )
 
-        # Send the embed to all channels
-        for channel_id in self._storage.get_active_channels():
-            channel = self.bot.get_channel(channel_id) or await self.bot.fetch_channel(channel_id)
+        try:
+            channel = await self._get_channel(channel_id)
             await channel.send(embed=embed)
+        except Exception as e:
+            print(f"Failed to post the check profile to {channel_id}: {e}")
+
+    def get_new_jobs_embeds(self, embeds: list[list[tuple[str, str]]]) -> list[disnake.Embed]:
+        """Creates an embed listing each group of jobs (see embed_packing.py)."""
+
+        timestamp = datetime.datetime.now()
+
+        return [
+            disnake.Embed(
+                title=embed_title,
+                description="\n".join(format_job(job) for job in jobs),
+                colour=self._storage.get_colour(),
+                timestamp=timestamp
+            )
+            for jobs in embeds
+        ]
+
+    async def _get_channel(self, channel_id: int) -> disnake.abc.Messageable:
+        """
+        Returns the channel, from our own cache if possible,
+        so a channel is only fetched from Discord once.
+        """
+
+        channel = self._channels.get(channel_id) or self.bot.get_channel(channel_id)
+
+        if channel is None:
+            channel = await self.bot.fetch_channel(channel_id)
+
+        self._channels[channel_id] = channel
+        return channel
+
+    async def resolve_channels(self):
+        """Fetches every active channel at once, and caches them."""
+
+        channel_ids = self._storage.get_active_channels()
+        channels = await asyncio.gather(
+            *(self._get_channel(channel_id) for channel_id in channel_ids), return_exceptions=True
+        )
+
+        for channel_id, channel in zip(channel_ids, channels):
+            if isinstance(channel, Exception):
+                print(f"Failed to find channel {channel_id}: {channel}")
+
+    async def deliver_notifications(self):
+        """
+        Sends the jobs queued in the outbox to Discord, forever.
+        Start it as a task on the bot's event loop. Wakes up
+        whenever a check queues new jobs, and whenever a
+        failed send is due to be retried.
+        """
+
+        await self.bot.wait_until_ready()
+        await self.resolve_channels()
+
+        while True:
+            self._outbox_filled.clear()
+
+            try:
+                while await self._deliver_due_notifications():
+                    pass
+            except Exception as e:
+                print(f"Failed to deliver notifications: {e}")
+                await asyncio.sleep(delivery_error_sleep_in_s)
+
+            next_attempt_at = await asyncio.to_thread(self._outbox.get_next_attempt_at)
+            metrics.notification_outbox_size.set(await asyncio.to_thread(self._outbox.count))
+
+            sleep_in_s = max_delivery_sleep_in_s
+            if next_attempt_at is not None:
+                sleep_in_s = min(max(next_attempt_at - time.time(), 0), max_delivery_sleep_in_s)
+
+            try:
+                await asyncio.wait_for(self._outbox_filled.wait(), sleep_in_s)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _deliver_due_notifications(self) -> bool:
+        """
+        Sends one batch of due outbox entries. Each channel is
+        sent the jobs it's interested in (see job_router.py),
+        packed into as few messages as possible, and channels
+        are sent to concurrently. Entries are removed once
+        they're sent. Entries for channels which are no longer
+        active, or which the bot can't see or post in, are
+        dropped. Failed sends are retried later.
+
+        :return: True if there were any due entries.
+        """
+
+        entries = await asyncio.to_thread(self._outbox.get_due, delivery_batch_size)
+        if len(entries) == 0:
+            return False
+
+        entries_by_channel: dict[int, list[OutboxEntry]] = {}
+        for entry in entries:
+            entries_by_channel.setdefault(entry.channel_id, []).append(entry)
+
+        # Guild subscriptions apply to every channel in the
+        # guild, so find out which guild each channel is in
+        active_channel_ids = set(self._storage.get_active_channels())
+        channels = {}
+        to_ack = []
+        to_retry = []
+
+        for channel_id, channel_entries in entries_by_channel.items():
+            if channel_id not in active_channel_ids:
+                to_ack.extend(channel_entries)
+                continue
+
+            try:
+                channels[channel_id] = await self._get_channel(channel_id)
+            except (disnake.NotFound, disnake.Forbidden) as e:
+                print(f"Dropping notifications for channel {channel_id}: {e}")
+                metrics.notification_failures.inc(1)
+                to_ack.extend(channel_entries)
+            except Exception as e:
+                print(f"Failed to find channel {channel_id}, retrying later: {e}")
+                metrics.notification_failures.inc(1)
+                to_retry.extend(channel_entries)
+
+        channel_guilds = {}
+        for channel_id, channel in channels.items():
+            guild = getattr(channel, "guild", None)
+            channel_guilds[channel_id] = None if guild is None else guild.id
+
+        router = JobRouter(
+            self._storage.get_subscriptions(),
+            self._storage.get_subscription_matcher(),
+            self._storage.get_keyword_matcher(),
+            channel_guilds
+        )
+        routes = router.route({entry.job for entry in entries})
+
+        # Entries for jobs a channel isn't interested in are done
+        wanted_entries_by_channel = {}
+        for channel_id in channels:
+            wanted_entries = []
+
+            for entry in entries_by_channel[channel_id]:
+                if entry.job in routes[channel_id]:
+                    wanted_entries.append(entry)
+                else:
+                    to_ack.append(entry)
+
+            if len(wanted_entries) > 0:
+                wanted_entries_by_channel[channel_id] = wanted_entries
+
+        semaphore = asyncio.Semaphore(max_concurrent_sends)
+
+        async def send_to_channel(channel_id: int, channel_entries: list[OutboxEntry]) -> int:
+            entries_by_job = {entry.job: entry for entry in channel_entries}
+            num_sent = 0
+
+            async with semaphore:
+                for embeds in pack_jobs(sorted(entries_by_job)):
+                    message_entries = [entries_by_job[job] for jobs in embeds for job in jobs]
+                    send_start = time.monotonic()
+
+                    try:
+                        await channels[channel_id].send(embeds=self.get_new_jobs_embeds(embeds))
+                        to_ack.extend(message_entries)
+                        num_sent += 1
+                    except (disnake.NotFound, disnake.Forbidden) as e:
+                        print(f"Dropping notifications for channel {channel_id}: {e}")
+                        metrics.notification_failures.inc(1)
+                        to_ack.extend(message_entries)
+                        self._channels.pop(channel_id, None)
+                    except Exception as e:
+                        print(f"Failed to notify channel {channel_id}, retrying later: {e}")
+                        metrics.notification_failures.inc(1)
+                        to_retry.extend(message_entries)
+                    finally:
+                        metrics.notification_send_duration.observe(time.monotonic() - send_start)
+
+            return num_sent
+
+        sent = await asyncio.gather(
+            *(send_to_channel(channel_id, channel_entries)
+              for channel_id, channel_entries in wanted_entries_by_channel.items())
+        )
+
+        await asyncio.to_thread(self._outbox.ack, to_ack)
+        await asyncio.to_thread(self._outbox.retry, to_retry)
+
+        if sum(sent) > 0:
+            print(f"Pushed {sum(sent)} notification(s) that new jobs have been found!")
 
-        print("Pushed notification that new jobs have been found!")
+        return True
@@ -0,0 +1,87 @@
+"""
+Embed Packing | Written by Joshua Sheldon
+
+Splits a list of new jobs into as few Discord messages
+as possible. Each message holds up to 10 embeds, and
+every job is a line in an embed's description, while
+staying within Discord's limits on the length of a
+description and on the total length of a message.
+"""
+
+# ---------- CONSTANTS ----------
+
+# Discord's limits
+max_embeds_per_message = 10
+max_description_length = 4096
+max_message_length = 6000
+
+embed_title = "NEW JOBS FOUND"
+
+# ---------- METHODS ----------
+
+
+def format_job(job: tuple[str, str]) -> str:
+    """
+    Formats a job as a line of an embed description. Titles
+    are shortened so that any line fits in a description.
+    """
+
+    line = f"- [{job[0]}]({job[1]})"
+
+    if len(line) > max_description_length:
+        title_length = max(max_description_length - (len(line) - len(job[0])) - 1, 0)
+        line = f"- [{job[0][:title_length]}…]({job[1]})"[:max_description_length]
+
+    return line
+
+
+def pack_jobs(jobs: list[tuple[str, str]]) -> list[list[list[tuple[str, str]]]]:
+    """
+    Packs jobs, in order, into messages of embeds.
+
+    :return: A list of messages, each a list of embeds, each
+             a list of the jobs in that embed.
+    """
+
+    messages = []
+    message = []
+    message_length = 0
+    embed = []
+    description_length = 0
+
+    for job in jobs:
+        line_length = len(format_job(job))
+
+        # Every line after the first starts with a newline
+        if len(embed) > 0 and (
+                description_length + 1 + line_length > max_description_length
+                or message_length + 1 + line_length > max_message_length
+        ):
+            message.append(embed)
+            embed = []
+
+        if len(embed) == 0:
+            # A new embed needs room for its title and first line
+            if len(message) > 0 and (
+                    len(message) == max_embeds_per_message
+                    or message_length + len(embed_title) + line_length > max_message_length
+            ):
+                messages.append(message)
+                message = []
+                message_length = 0
+
+            embed.append(job)
+            description_length = line_length
+            message_length += len(embed_title) + line_length
+        else:
+            embed.append(job)
+            description_length += 1 + line_length
+            message_length += 1 + line_length
+
+    if len(embed) > 0:
+        message.append(embed)
+
+    if len(message) > 0:
+        messages.append(message)
+
+    return messages
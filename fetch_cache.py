@@ -0,0 +1,235 @@
+"""
+Fetch Cache | Written by Joshua Sheldon
+
+A fetch helper for scrapers. It remembers the ETag
+and Last-Modified validators and a hash of the body
+of every page it fetches, along with the result of
+parsing that page. When a job board answers with
+304 Not Modified, or sends back the exact same page,
+the remembered result is returned instead of parsing
+the page again. The cache holds a limited number of
+pages and is saved to a file between runs.
+"""
+
+# ---------- IMPORTS ----------
+
+# Python Default Imports
+from collections import OrderedDict
+import copy
+import hashlib
+import os
+from threading import Lock
+from typing import Any, Callable
+
+# Pip Sourced Imports
+import jsonpickle
+import requests
+
+# Local Imports
+from persistent_storage import write_atomically
+from polite_http import get_polite_session
+
+# ---------- CONSTANTS ----------
+
+cache_file_name = "fetch_cache.json"
+
+# Moves the cache file elsewhere when set (read by
+# scraper worker processes too)
+cache_file_variable = "JOBSPOTBOT_FETCH_CACHE"
+
+# Most pages remembered at once. The least recently
+# fetched page is forgotten first.
+max_cache_entries = 256
+
+# ---------- CLASSES & METHODS ----------
+
+
+class CacheEntry:
+    """
+    Everything remembered about one page: its validators,
+    the hash of its body, and the result of every parse
+    function which has been run on it.
+    """
+
+    # Instance Variables
+    etag: str | None
+    last_modified: str | None
+    body_hash: str
+    results: dict[str, Any]
+
+    def __init__(self, etag, last_modified, body_hash, results):
+        self.etag = etag
+        self.last_modified = last_modified
+        self.body_hash = body_hash
+        self.results = results
+
+
+def get_parser_name(parse: Callable) -> str:
+    return f"{parse.__module__}.{parse.__qualname__}"
+
+
+class FetchCache:
+    """
+    Fetches pages through the shared, rate limited HTTP
+    session (see polite_http.py), and memoizes the result
+    of parsing them.
+    """
+
+    _entries: OrderedDict[str, CacheEntry]
+    _lock: Lock
+    _dirty: bool
+
+    def __init__(self, entries: OrderedDict[str, CacheEntry]):
+        self._entries = entries
+        self._lock = Lock()
+        self._dirty = False
+
+    def fetch(self, url: str, parse: Callable[[str], Any]) -> Any:
+        """
+        Fetches the page at the URL and returns the result of
+        parsing its text with the parse function. If the page
+        hasn't changed since it was last parsed with the same
+        function, the previous result is returned without
+        parsing the page again.
+
+        Results are remembered by the name of the parse
+        function, so use a named function rather than a
+        lambda.
+
+        :return: The result of parse, or None if the
+                 page couldn't be fetched.
+        """
+
+        parser_name = get_parser_name(parse)
+
+        with self._lock:
+            entry = self._entries.get(url)
+
+        headers = {}
+        if entry is not None and parser_name in entry.results:
+            if entry.etag is not None:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified is not None:
+                headers["If-Modified-Since"] = entry.last_modified
+
+        response = get_polite_session().get(url, headers=headers)
+
+        if response.status_code == requests.codes.not_modified and entry is not None:
+            return self._reuse(url, entry, parser_name, entry.etag, entry.last_modified)
+
+        if response.status_code != requests.codes.ok:
+            print(f"Failed to fetch {url} ({response.status_code})")
+            return None
+
+        body_hash = hashlib.sha256(response.content).hexdigest()
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+
+        if entry is not None and entry.body_hash == body_hash and parser_name in entry.results:
+            return self._reuse(url, entry, parser_name, etag, last_modified)
+
+        result = parse(response.text)
+
+        with self._lock:
+            # The page changed, so results from other parse
+            # functions are out of date
+            if entry is None or entry.body_hash != body_hash:
+                entry = CacheEntry(etag, last_modified, body_hash, dict())
+
+            entry.etag = etag
+            entry.last_modified = last_modified
+            entry.results[parser_name] = copy.copy(result)
+
+            self._entries[url] = entry
+            self._entries.move_to_end(url)
+
+            while len(self._entries) > max_cache_entries:
+                self._entries.popitem(last=False)
+
+            self._dirty = True
+
+        return result
+
+    def _reuse(self, url: str, entry: CacheEntry, parser_name: str, etag: str | None,
+               last_modified: str | None) -> Any:
+        """
+        Returns the remembered result of parsing the page,
+        after updating the page's validators. The cache is
+        only saved again if the validators changed.
+        """
+
+        with self._lock:
+            if url in self._entries:
+                self._entries.move_to_end(url)
+
+            if entry.etag != etag or entry.last_modified != last_modified:
+                entry.etag = etag
+                entry.last_modified = last_modified
+                self._dirty = True
+
+        # Copy, so the scraper can't modify the cached result
+        return copy.copy(entry.results[parser_name])
+
+    def save(self):
+        """Writes the cache to its file, if it changed."""
+
+        with self._lock:
+            if not self._dirty:
+                return
+
+            text = jsonpickle.encode(self._entries)
+            self._dirty = False
+
+        write_atomically(get_cache_path(), text)
+
+
+def get_cache_path() -> str:
+    return os.environ.get(cache_file_variable) or cache_file_name
+
+
+_cache: FetchCache | None = None
+_cache_lock = Lock()
+
+
+def get_fetch_cache() -> FetchCache:
+    """
+    Returns the shared FetchCache, loading it from its
+    file the first time it's needed.
+    """
+
+    global _cache
+
+    with _cache_lock:
+        if _cache is None:
+            entries = OrderedDict()
+
+            try:
+                file = open(get_cache_path(), "r")
+                text = file.read()
+                file.close()
+
+                entries = jsonpickle.decode(text)
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                # Only a cache, start over
+                print(f"Failed to read fetch cache, starting empty: {e}")
+
+            _cache = FetchCache(entries)
+
+        return _cache
+
+
+def fetch_cached(url: str, parse: Callable[[str], Any]) -> Any:
+    """
+    Fetches and parses the page at the URL through the
+    shared FetchCache. See FetchCache.fetch().
+    """
+    return get_fetch_cache().fetch(url, parse)
+
+
+def save_fetch_cache():
+    """Saves the shared FetchCache, if it's been used."""
+
+    if _cache is not None:
+        _cache.save()
@@ -0,0 +1,163 @@
+"""
+Headless Check | Written by Joshua Sheldon
+
+Runs a single check for new jobs without the Discord
+bot (or a bot token), and writes the new jobs it finds
+as JSON lines, one {"title": ..., "link": ...} object
+per job. Useful to check from cron, or to profile the
+check pipeline.
+
+Responses can be recorded to a directory of fixtures,
+and replayed from it later without touching the network
+(see http_replay.py), so checks can be compared offline
+on the exact same pages:
+
+    python headless_check.py --record fixtures/ --dry-run
+    python headless_check.py --replay fixtures/ --dry-run --output new_jobs.jsonl
+"""
+
+# ---------- IMPORTS ----------
+
+# Python Default Imports
+import argparse
+import contextlib
+import json
+import os
+from pathlib import Path
+import shutil
+import sqlite3
+import sys
+import tempfile
+
+# Local Imports
+from fetch_cache import cache_file_name, cache_file_variable
+from http_replay import record_directory_variable, replay_directory_variable
+from jobs_check import run_jobs_check
+from persistent_storage import Storage, database_file_name, file_name, fingerprints_file_name
+from scraper_loader import ScraperLoader, scrapers_dir_name
+
+# ---------- METHODS ----------
+
+
+def parse_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Runs a single check for new jobs, without the Discord bot.")
+    parser.add_argument("--storage", default=file_name, help="the storage file to check against")
+    parser.add_argument("--output", default="-", help="where to write new jobs as JSON lines (\"-\" for stdout)")
+    parser.add_argument("--unfiltered", action="store_true", help="write new jobs which don't match any keyword too")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="check against a temporary copy of the storage, so known jobs aren't updated")
+
+    http = parser.add_mutually_exclusive_group()
+    http.add_argument("--record", metavar="DIRECTORY", help="record every response to a directory of fixtures")
+    http.add_argument("--replay", metavar="DIRECTORY", help="replay recorded responses instead of fetching pages")
+
+    return parser.parse_args()
+
+
+def copy_storage(path: str, directory: str) -> str:
+    """
+    Copies the storage file, and the files of the other
+    storage backends next to it, into a directory.
+
+    :return: The path of the copied storage file.
+    """
+
+    source_directory = os.path.dirname(path)
+
+    # The database is in WAL mode, so copy it through
+    # SQLite to include rows still in the WAL file
+    database_path = os.path.join(source_directory, database_file_name)
+    if os.path.exists(database_path):
+        source = sqlite3.connect(database_path)
+        copy = sqlite3.connect(os.path.join(directory, database_file_name))
+        try:
+            source.backup(copy)
+        finally:
+            copy.close()
+            source.close()
+
+    fingerprints_path = os.path.join(source_directory, fingerprints_file_name)
+    if os.path.exists(fingerprints_path):
+        shutil.copy(fingerprints_path, directory)
+
+    copied_path = os.path.join(directory, file_name)
+    shutil.copy(path, copied_path)
+    return copied_path
+
+
+def write_jobs(jobs: set[tuple[str, str]], output: str):
+    lines = [json.dumps({"title": title, "link": link}) + "\n" for title, link in sorted(jobs)]
+
+    if output == "-":
+        sys.stdout.writelines(lines)
+        sys.stdout.flush()
+        return
+
+    file = open(output, "w")
+    file.writelines(lines)
+    file.close()
+
+
+def run(arguments: argparse.Namespace, storage_path: str) -> set[tuple[str, str]] | None:
+    """
+    Loads the scrapers and runs the check.
+
+    :return: The new jobs, or None if no scrapers loaded.
+    """
+
+    storage = Storage(storage_path)
+
+    loader = ScraperLoader(Path(scrapers_dir_name))
+    loader.sync()
+
+    if len(loader.scrapers) == 0:
+        print("No scrapers successfully loaded!")
+        return None
+
+    print(f"Successfully loaded {len(loader.scrapers)} scrapers!")
+    result = run_jobs_check(loader.scrapers, storage)
+
+    # Write the known jobs before exiting
+    storage.close()
+
+    if arguments.unfiltered:
+        return result.unfiltered_new_jobs
+
+    return result.new_jobs
+
+
+def main() -> int:
+    arguments = parse_arguments()
+
+    # Read by the shared HTTP session when it's created,
+    # including in scraper worker processes
+    if arguments.record is not None:
+        os.environ[record_directory_variable] = os.path.abspath(arguments.record)
+    if arguments.replay is not None:
+        os.environ[replay_directory_variable] = os.path.abspath(arguments.replay)
+
+    # Keep stdout for the new jobs
+    log_output = sys.stderr if arguments.output == "-" else sys.stdout
+
+    with contextlib.redirect_stdout(log_output), tempfile.TemporaryDirectory(prefix="jobspotbot-") as directory:
+        storage_path = arguments.storage
+        if arguments.dry_run:
+            storage_path = copy_storage(storage_path, directory)
+
+        # Start from an empty fetch cache in the temporary
+        # directory, so parse results aren't saved over the
+        # real cache, and replays don't depend on them
+        if arguments.dry_run or arguments.replay is not None:
+            os.environ[cache_file_variable] = os.path.join(directory, cache_file_name)
+
+        new_jobs = run(arguments, storage_path)
+
+    if new_jobs is None:
+        return 1
+
+    write_jobs(new_jobs, arguments.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
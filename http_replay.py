@@ -0,0 +1,154 @@
+"""
+HTTP Replay | Written by Joshua Sheldon
+
+Records the responses scrapers get to a directory of
+fixtures, and replays them later without touching the
+network, so checks can be profiled and compared on the
+exact same pages, offline. Recording and replaying are
+switched on with environment variables (so scraper
+worker processes pick them up too), and apply to every
+request sent through the shared session in
+polite_http.py. Async scrapers use their own session,
+and aren't recorded.
+"""
+
+# ---------- IMPORTS ----------
+
+# Python Default Imports
+import base64
+import hashlib
+import io
+import json
+import os
+import threading
+
+# Pip Sourced Imports
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+# ---------- CONSTANTS ----------
+
+record_directory_variable = "JOBSPOTBOT_RECORD_DIR"
+replay_directory_variable = "JOBSPOTBOT_REPLAY_DIR"
+
+# Removed so that whole pages are recorded, rather
+# than "not modified" answers to the fetch cache
+conditional_headers = ("If-None-Match", "If-Modified-Since")
+
+# Bodies are recorded decoded, so these no longer apply
+dropped_headers = ("Content-Encoding", "Content-Length", "Transfer-Encoding")
+
+# ---------- CLASSES & METHODS ----------
+
+
+def get_fixture_path(directory: str, request: requests.PreparedRequest) -> str:
+    """Returns the file the response to a request is recorded in."""
+
+    key = hashlib.sha256(f"{request.method} {request.url}\n".encode("utf-8"))
+
+    body = request.body
+    if body is not None:
+        key.update(body.encode("utf-8") if isinstance(body, str) else body)
+
+    return os.path.join(directory, key.hexdigest()[:32] + ".json")
+
+
+class RecordingAdapter(HTTPAdapter):
+    """Sends requests as normal, and records every response."""
+
+    _directory: str
+
+    def __init__(self, directory: str, **kwargs):
+        super().__init__(**kwargs)
+        self._directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def send(self, request: requests.PreparedRequest, **kwargs) -> requests.Response:
+        for header in conditional_headers:
+            request.headers.pop(header, None)
+
+        response = super().send(request, **kwargs)
+
+        fixture = {
+            "method": request.method,
+            "url": request.url,
+            "status_code": response.status_code,
+            "reason": response.reason,
+            "headers": {
+                name: value for name, value in response.headers.items() if name.title() not in dropped_headers
+            },
+            # Reads the whole body, which the response keeps
+            "body": base64.b64encode(response.content).decode("ascii")
+        }
+
+        # Several scrapers may fetch the same page at once
+        path = get_fixture_path(self._directory, request)
+        temporary_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+        file = open(temporary_path, "w")
+        file.write(json.dumps(fixture, indent=2))
+        file.close()
+        os.replace(temporary_path, path)
+
+        return response
+
+
+class ReplayAdapter(BaseAdapter):
+    """
+    Answers requests with recorded responses. Requests which
+    weren't recorded fail like a connection error would.
+    """
+
+    _directory: str
+
+    def __init__(self, directory: str):
+        super().__init__()
+        self._directory = directory
+
+    def send(self, request: requests.PreparedRequest, stream=False, timeout=None, verify=True, cert=None,
+             proxies=None) -> requests.Response:
+        try:
+            file = open(get_fixture_path(self._directory, request), "r")
+            fixture = json.loads(file.read())
+            file.close()
+        except FileNotFoundError:
+            raise requests.ConnectionError(f"No recorded response for {request.method} {request.url}",
+                                           request=request)
+
+        response = requests.Response()
+        response.status_code = fixture["status_code"]
+        response.reason = fixture["reason"]
+        response.headers = CaseInsensitiveDict(fixture["headers"])
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.raw = io.BytesIO(base64.b64decode(fixture["body"]))
+        response.url = request.url
+        response.request = request
+
+        return response
+
+    def close(self):
+        pass
+
+
+def get_adapter_from_environment(**kwargs) -> BaseAdapter:
+    """
+    Returns the adapter the environment asks for: one which
+    replays or records responses, or a regular HTTPAdapter.
+    Keyword arguments are passed on to the HTTPAdapter.
+    """
+
+    replay_directory = os.environ.get(replay_directory_variable)
+    if replay_directory:
+        return ReplayAdapter(replay_directory)
+
+    record_directory = os.environ.get(record_directory_variable)
+    if record_directory:
+        return RecordingAdapter(record_directory, **kwargs)
+
+    return HTTPAdapter(**kwargs)
+
+
+def is_replaying() -> bool:
+    return bool(os.environ.get(replay_directory_variable))
@@ -0,0 +1,107 @@
+"""
+Job Normalization | Written by Joshua Sheldon
+
+Turns the jobs scrapers return into a stable identity,
+so the same job isn't reported as new again because a
+job board added tracking parameters to its link,
+rotated a session token, or changed the whitespace in
+its title. The same posting on two job boards which
+link to the same page is also only reported once.
+"""
+
+# ---------- IMPORTS ----------
+
+# Python Default Imports
+import re
+import unicodedata
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# ---------- CONSTANTS ----------
+
+# Query parameters which only track where a visitor came
+# from, or which session they're in. Ambiguous names like
+# "ref" and "sid" are left out, since some job boards use
+# them to identify a posting. Scrapers of boards which
+# don't can list them in ignored_link_params.
+tracking_params = frozenset({
+    "_ga", "_gl", "dclid", "fbclid", "gclid", "gh_src", "igshid", "jsessionid", "mc_cid", "mc_eid", "msclkid",
+    "phpsessid", "refid", "sessionid", "trackingid", "trk", "yclid"
+})
+tracking_param_prefixes = ("utm_",)
+
+# Session IDs some servers put in the path (ex. "/jobs;jsessionid=ABC")
+path_session_pattern = re.compile(r";jsessionid=[^/?#]*", re.IGNORECASE)
+
+default_ports = {"http": ":80", "https": ":443"}
+
+# ---------- METHODS ----------
+
+
+def is_tracking_param(name: str, ignored_params: frozenset[str] = frozenset()) -> bool:
+    name = name.lower()
+    return name in tracking_params or name in ignored_params or name.startswith(tracking_param_prefixes)
+
+
+def canonicalize_link(link: str, ignored_params: frozenset[str] = frozenset()) -> str:
+    """
+    Returns the canonical form of a link: the scheme and host
+    in lowercase, without a default port, a fragment, session
+    IDs, or tracking parameters (nor any parameter named in
+    ignored_params, in lowercase), and with the remaining
+    parameters sorted. Links which aren't absolute URLs are
+    only stripped of surrounding whitespace.
+    """
+
+    link = link.strip()
+
+    try:
+        parts = urlsplit(link)
+    except ValueError:
+        return link
+
+    if parts.scheme == "" or parts.netloc == "":
+        return link
+
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.lower()
+
+    default_port = default_ports.get(scheme)
+    if default_port is not None and netloc.endswith(default_port):
+        netloc = netloc[:-len(default_port)]
+
+    path = path_session_pattern.sub("", parts.path) or "/"
+
+    query = sorted(
+        (name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not is_tracking_param(name, ignored_params)
+    )
+
+    return urlunsplit((scheme, netloc, path, urlencode(query), ""))
+
+
+def normalize_title(title: str) -> str:
+    """
+    Returns the title with equivalent Unicode characters
+    unified, and runs of whitespace collapsed to a space.
+    """
+    return " ".join(unicodedata.normalize("NFKC", title).split())
+
+
+def normalize_job(title: str, link: str, ignored_params: frozenset[str] = frozenset()) -> tuple[str, str]:
+    """Returns the job with a normalized title and canonical link."""
+    return normalize_title(title), canonicalize_link(link, ignored_params)
+
+
+def deduplicate_jobs(jobs: set[tuple[str, str]]) -> set[tuple[str, str]]:
+    """
+    Keeps one job for every link and title (ignoring case),
+    so a posting which two job boards capitalize differently
+    is only reported once.
+    """
+
+    jobs_by_key = {}
+
+    for job in sorted(jobs):
+        jobs_by_key.setdefault((job[0].casefold(), job[1]), job)
+
+    return set(jobs_by_key.values())
@@ -0,0 +1,104 @@
+"""
+Job Router | Written by Joshua Sheldon
+
+Decides which channels each new job is sent to. Guilds
+and channels can subscribe to keywords, and a channel
+receives the new jobs whose titles contain a keyword
+it (or its guild) subscribed to. Channels without any
+subscriptions receive every new job which contains one
+of the global keywords, as before subscriptions.
+
+Routing goes through an inverted index from keywords
+to the channels subscribed to them. Each title is
+scanned once for every subscribed keyword it contains,
+so routing doesn't get slower with every subscription.
+"""
+
+# ---------- IMPORTS ----------
+
+# Local Imports
+from keyword_matcher import KeywordMatcher
+
+# ---------- CONSTANTS ----------
+
+scope_guild = "guild"
+scope_channel = "channel"
+
+# ---------- CLASSES ----------
+
+
+class JobRouter:
+    """
+    Routes new jobs to channels, given every subscription
+    and the guild of every channel jobs can be sent to.
+    """
+
+    _subscription_matcher: KeywordMatcher
+    _keyword_matcher: KeywordMatcher
+    _index: dict[str, set[int]]
+    _channel_ids: list[int]
+    _unsubscribed_channel_ids: list[int]
+
+    def __init__(
+            self,
+            subscriptions: set[tuple[str, int, str]],
+            subscription_matcher: KeywordMatcher,
+            keyword_matcher: KeywordMatcher,
+            channel_guilds: dict[int, int | None]
+    ):
+        """
+        :param subscriptions: Every subscription, as (scope,
+                              scope ID, keyword).
+        :param subscription_matcher: The keywords of every
+                                     subscription, compiled.
+        :param keyword_matcher: The global keywords, compiled.
+        :param channel_guilds: The ID of the guild every channel
+                               is in (None if it's in none).
+        """
+        self._subscription_matcher = subscription_matcher
+        self._keyword_matcher = keyword_matcher
+        self._channel_ids = list(channel_guilds)
+
+        guild_channels: dict[int, set[int]] = {}
+        for channel_id, guild_id in channel_guilds.items():
+            if guild_id is not None:
+                guild_channels.setdefault(guild_id, set()).add(channel_id)
+
+        # Subscriptions of channels jobs aren't sent to
+        # (and of guilds without such channels) are ignored
+        self._index = {}
+        for scope, scope_id, keyword in subscriptions:
+            if scope == scope_channel and scope_id in channel_guilds:
+                self._index.setdefault(keyword, set()).add(scope_id)
+            elif scope == scope_guild and scope_id in guild_channels:
+                self._index.setdefault(keyword, set()).update(guild_channels[scope_id])
+
+        subscribed_channel_ids = set().union(*self._index.values())
+        self._unsubscribed_channel_ids = [
+            channel_id for channel_id in self._channel_ids if channel_id not in subscribed_channel_ids
+        ]
+
+    def route(self, new_jobs: set[tuple[str, str]]) -> dict[int, set[tuple[str, str]]]:
+        """
+        :return: The new jobs each channel should be sent,
+                 for every channel.
+        """
+
+        routes = {channel_id: set() for channel_id in self._channel_ids}
+
+        if len(self._index) > 0:
+            for job in new_jobs:
+                for keyword in self._subscription_matcher.find_matches(job[0]):
+                    for channel_id in self._index.get(keyword, ()):
+                        routes[channel_id].add(job)
+
+        if len(self._unsubscribed_channel_ids) > 0:
+            if len(self._keyword_matcher) > 0:
+                default_jobs = {job for job in new_jobs if self._keyword_matcher.matches(job[0])}
+            else:
+                default_jobs = new_jobs
+
+            for channel_id in self._unsubscribed_channel_ids:
+                routes[channel_id] = set(default_jobs)
+
+        return routes
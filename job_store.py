@@ -0,0 +1,825 @@
+"""
+Job Store | Written by Joshua Sheldon
+
+Backends which hold the keywords and known jobs
+JobSpotBot keeps between runs. The JSON backend
+keeps them inside the storage file alongside the
+rest of the settings, while the SQLite backend
+keeps them in an indexed database, so that each
+change only costs as much as the rows it touches.
+The fingerprint backend only keeps a 64-bit hash of
+every known job, in sorted arrays which are saved to
+a compact binary file.
+
+Known jobs are partitioned by the scraper which
+found them, so that a scraper failing only ever
+affects its own partition.
+
+Subscriptions are keywords scoped to a guild or a
+channel, stored as (scope, scope ID, keyword).
+"""
+
+# ---------- IMPORTS ----------
+
+# Python Default Imports
+from abc import ABC, abstractmethod
+from array import array
+from bisect import bisect_left, insort
+import hashlib
+import sqlite3
+import struct
+import sys
+from threading import Lock
+from typing import Callable
+
+# ---------- CONSTANTS ----------
+
+backend_json = "json"
+backend_sqlite = "sqlite"
+backend_fingerprint = "fingerprint"
+
+# Known jobs stored before partitioning was introduced.
+# Jobs are moved out of this partition as scrapers find
+# them again, so it drains away over time.
+legacy_partition = ""
+
+# Bumped whenever the SQLite schema changes
+schema_version = 3
+
+# The fingerprint file starts with a magic number, a
+# version and the number of partitions. Each partition
+# is its name, its length and its sorted fingerprints,
+# all little-endian.
+fingerprint_file_magic = b"JSBF"
+fingerprint_file_version = 1
+fingerprint_file_header = struct.Struct("<4sII")
+fingerprint_partition_header = struct.Struct("<IQ")
+
+# Up to this many fingerprints are inserted into a
+# partition one by one, more and it's rebuilt instead
+max_fingerprint_insertions = 256
+
+# ---------- CLASSES & METHODS ----------
+
+
+def get_fingerprint(job: tuple[str, str]) -> int:
+    """Returns a 64-bit hash of the job's title and link."""
+
+    digest = hashlib.blake2b(f"{job[0]}\x00{job[1]}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def contains_fingerprint(fingerprints: array, fingerprint: int) -> bool:
+    """Tests whether a sorted array holds the fingerprint."""
+
+    i = bisect_left(fingerprints, fingerprint)
+    return i < len(fingerprints) and fingerprints[i] == fingerprint
+
+
+class PartitionDelta:
+    """
+    How a partition of known jobs changed when it was
+    replaced or added to: the jobs which were added to
+    it, and how many jobs were removed from it.
+    """
+
+    # Instance Variables
+    added: set[tuple[str, str]]
+    num_removed: int
+
+    def __init__(self, added, num_removed):
+        self.added = added
+        self.num_removed = num_removed
+
+    def is_empty(self) -> bool:
+        return len(self.added) == 0 and self.num_removed == 0
+
+
+class JobStore(ABC):
+    """
+    Holds the set of keywords, the subscriptions, and the
+    known jobs, which are partitioned by source (the name
+    of the scraper which found them). Keywords are always
+    stored in lowercase.
+    """
+
+    @abstractmethod
+    def get_keywords(self) -> set:
+        pass
+
+    @abstractmethod
+    def add_keyword(self, keyword: str) -> bool:
+        """
+        :return: True if the keyword was added, False if
+                 it was already stored.
+        """
+        pass
+
+    @abstractmethod
+    def del_keyword(self, keyword: str) -> bool:
+        """
+        :return: True if the keyword was removed, False if
+                 it wasn't stored.
+        """
+        pass
+
+    @abstractmethod
+    def get_subscriptions(self) -> set[tuple[str, int, str]]:
+        pass
+
+    @abstractmethod
+    def add_subscription(self, subscription: tuple[str, int, str]) -> bool:
+        """
+        :return: True if the subscription was added, False
+                 if it was already stored.
+        """
+        pass
+
+    @abstractmethod
+    def del_subscription(self, subscription: tuple[str, int, str]) -> bool:
+        """
+        :return: True if the subscription was removed, False
+                 if it wasn't stored.
+        """
+        pass
+
+    @abstractmethod
+    def get_known_jobs(self) -> set:
+        """
+        :return: The known jobs of every partition. Backends
+                 which don't keep the jobs themselves return
+                 a container which only supports len() and
+                 membership tests.
+        """
+        pass
+
+    @abstractmethod
+    def get_known_jobs_partition(self, source: str) -> set:
+        """
+        :return: The known jobs of one partition, with the
+                 same caveat as get_known_jobs().
+        """
+        pass
+
+    @abstractmethod
+    def count_known_jobs(self) -> int:
+        pass
+
+    @abstractmethod
+    def is_known_job(self, job: tuple[str, str]) -> bool:
+        """
+        :return: True if the job is known in any partition.
+        """
+        pass
+
+    @abstractmethod
+    def get_new_jobs(self, open_jobs: set[tuple[str, str]]) -> set[tuple[str, str]]:
+        """
+        :return: Every job in open_jobs which isn't known in
+                 any partition.
+        """
+        pass
+
+    @abstractmethod
+    def replace_known_jobs_partition(self, source: str, jobs: set[tuple[str, str]]) -> PartitionDelta:
+        """
+        Replaces the known jobs of one source. Any of the jobs
+        still in the legacy partition are moved out of it.
+        Nothing is written if the partition didn't change.
+        """
+        pass
+
+    @abstractmethod
+    def add_to_known_jobs_partition(self, source: str, jobs: set[tuple[str, str]]) -> PartitionDelta:
+        """
+        Adds jobs to the known jobs of one source, without
+        removing any. Used when a scraper only found some of
+        its open jobs. Any of the jobs still in the legacy
+        partition are moved out of it.
+        """
+        pass
+
+    def take_unsaved_file(self) -> tuple[str, bytes] | None:
+        """
+        Returns the path and contents of a file holding changes
+        which haven't been written yet, and forgets about them.
+        The storage file is written after it, by the same
+        flush. Stores which save changes themselves return None.
+        """
+        return None
+
+    def mark_unsaved(self):
+        """Called when the file from take_unsaved_file() couldn't be written."""
+        pass
+
+    def close(self):
+        """Releases anything the store holds open. The store can't be used afterwards."""
+        pass
+
+
+class JsonJobStore(JobStore):
+    """
+    Keeps keywords and known jobs in the StorageObject,
+    and rewrites the storage file through the given
+    save function whenever they change.
+    """
+
+    _storage_object: object
+    _save: Callable[[], None]
+
+    def __init__(self, storage_object, save: Callable[[], None]):
+        self._storage_object = storage_object
+        self._save = save
+
+    def get_keywords(self) -> set:
+        return self._storage_object.keywords
+
+    def add_keyword(self, keyword: str) -> bool:
+        if keyword in self._storage_object.keywords:
+            return False
+
+        self._storage_object.keywords.add(keyword)
+        self._save()
+        return True
+
+    def del_keyword(self, keyword: str) -> bool:
+        try:
+            self._storage_object.keywords.remove(keyword)
+        except KeyError:
+            return False
+
+        self._save()
+        return True
+
+    def get_subscriptions(self) -> set[tuple[str, int, str]]:
+        return self._storage_object.subscriptions
+
+    def add_subscription(self, subscription: tuple[str, int, str]) -> bool:
+        if subscription in self._storage_object.subscriptions:
+            return False
+
+        self._storage_object.subscriptions.add(subscription)
+        self._save()
+        return True
+
+    def del_subscription(self, subscription: tuple[str, int, str]) -> bool:
+        try:
+            self._storage_object.subscriptions.remove(subscription)
+        except KeyError:
+            return False
+
+        self._save()
+        return True
+
+    def get_known_jobs(self) -> set:
+        known_jobs = set()
+
+        for partition in self._storage_object.known_jobs.values():
+            known_jobs.update(partition)
+
+        return known_jobs
+
+    def get_known_jobs_partition(self, source: str) -> set:
+        return self._storage_object.known_jobs.get(source, set())
+
+    def count_known_jobs(self) -> int:
+        return sum(len(partition) for partition in self._storage_object.known_jobs.values())
+
+    def is_known_job(self, job: tuple[str, str]) -> bool:
+        for partition in self._storage_object.known_jobs.values():
+            if job in partition:
+                return True
+
+        return False
+
+    def get_new_jobs(self, open_jobs: set[tuple[str, str]]) -> set[tuple[str, str]]:
+        new_jobs = open_jobs
+
+        for partition in self._storage_object.known_jobs.values():
+            new_jobs = new_jobs - partition
+
+        return new_jobs
+
+    def replace_known_jobs_partition(self, source: str, jobs: set[tuple[str, str]]) -> PartitionDelta:
+        partitions = self._storage_object.known_jobs
+        old_jobs = partitions.get(source, set())
+
+        delta = PartitionDelta(jobs - old_jobs, len(old_jobs - jobs))
+
+        # Move found jobs out of the legacy partition
+        legacy_jobs = partitions.get(legacy_partition)
+        claimed_legacy_jobs = set() if legacy_jobs is None or source == legacy_partition else legacy_jobs & jobs
+
+        if delta.is_empty() and len(claimed_legacy_jobs) == 0:
+            return delta
+
+        partitions[source] = set(jobs)
+
+        if len(claimed_legacy_jobs) > 0:
+            legacy_jobs -= claimed_legacy_jobs
+            if len(legacy_jobs) == 0:
+                del partitions[legacy_partition]
+
+        self._save()
+        return delta
+
+    def add_to_known_jobs_partition(self, source: str, jobs: set[tuple[str, str]]) -> PartitionDelta:
+        old_jobs = self._storage_object.known_jobs.get(source, set())
+        return self.replace_known_jobs_partition(source, old_jobs | jobs)
+
+
+class SqliteJobStore(JobStore):
+    """
+    Keeps keywords and known jobs in a SQLite database.
+    Both tables are keyed on their contents, so every
+    membership test is an index lookup, and the set
+    difference between open and known jobs is computed
+    by the database. Every change is one transaction,
+    so a crash can never leave a half-written store.
+    """
+
+    _connection: sqlite3.Connection
+    _lock: Lock
+
+    def __init__(self, path: str):
+        # The connection is shared between the scheduler
+        # thread and the Discord bot, the lock serializes
+        # access to it
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = Lock()
+
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+
+            # Create or migrate the schema in one transaction
+            self._connection.execute("BEGIN")
+            version = self._connection.execute("PRAGMA user_version").fetchone()[0]
+
+            if version == 1:
+                # Version 1 didn't partition known jobs, so all
+                # of them go into the legacy partition
+                self._connection.execute("ALTER TABLE known_jobs RENAME TO known_jobs_v1")
+
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS known_jobs ("
+                "source TEXT NOT NULL, title TEXT NOT NULL, link TEXT NOT NULL, "
+                "PRIMARY KEY (source, title, link)) WITHOUT ROWID"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS known_jobs_by_job ON known_jobs (title, link)")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS keywords (keyword TEXT PRIMARY KEY) WITHOUT ROWID"
+            )
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS subscriptions ("
+                "scope TEXT NOT NULL, scope_id INTEGER NOT NULL, keyword TEXT NOT NULL, "
+                "PRIMARY KEY (scope, scope_id, keyword)) WITHOUT ROWID"
+            )
+
+            if version == 1:
+                self._connection.execute(
+                    "INSERT INTO known_jobs SELECT ?, title, link FROM known_jobs_v1", (legacy_partition,)
+                )
+                self._connection.execute("DROP TABLE known_jobs_v1")
+
+            self._connection.execute(f"PRAGMA user_version={schema_version}")
+
+    def _fill_open_jobs_table(self, jobs: set[tuple[str, str]]):
+        """
+        Loads jobs into a temporary table, so the database
+        can compare them against the known jobs. Must be
+        called with the lock held.
+        """
+        self._connection.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS open_jobs ("
+            "title TEXT NOT NULL, link TEXT NOT NULL, "
+            "PRIMARY KEY (title, link)) WITHOUT ROWID"
+        )
+        self._connection.execute("DELETE FROM temp.open_jobs")
+        self._connection.executemany("INSERT OR IGNORE INTO temp.open_jobs VALUES (?, ?)", jobs)
+
+    def get_keywords(self) -> set:
+        with self._lock:
+            rows = self._connection.execute("SELECT keyword FROM keywords").fetchall()
+
+        return {row[0] for row in rows}
+
+    def add_keyword(self, keyword: str) -> bool:
+        with self._lock, self._connection:
+            cursor = self._connection.execute("INSERT OR IGNORE INTO keywords VALUES (?)", (keyword,))
+
+        return cursor.rowcount > 0
+
+    def del_keyword(self, keyword: str) -> bool:
+        with self._lock, self._connection:
+            cursor = self._connection.execute("DELETE FROM keywords WHERE keyword = ?", (keyword,))
+
+        return cursor.rowcount > 0
+
+    def get_subscriptions(self) -> set[tuple[str, int, str]]:
+        with self._lock:
+            rows = self._connection.execute("SELECT scope, scope_id, keyword FROM subscriptions").fetchall()
+
+        return set(rows)
+
+    def add_subscription(self, subscription: tuple[str, int, str]) -> bool:
+        with self._lock, self._connection:
+            cursor = self._connection.execute("INSERT OR IGNORE INTO subscriptions VALUES (?, ?, ?)", subscription)
+
+        return cursor.rowcount > 0
+
+    def del_subscription(self, subscription: tuple[str, int, str]) -> bool:
+        with self._lock, self._connection:
+            cursor = self._connection.execute(
+                "DELETE FROM subscriptions WHERE scope = ? AND scope_id = ? AND keyword = ?", subscription
+            )
+
+        return cursor.rowcount > 0
+
+    def get_known_jobs(self) -> set:
+        with self._lock:
+            rows = self._connection.execute("SELECT DISTINCT title, link FROM known_jobs").fetchall()
+
+        return set(rows)
+
+    def get_known_jobs_partition(self, source: str) -> set:
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT title, link FROM known_jobs WHERE source = ?", (source,)
+            ).fetchall()
+
+        return set(rows)
+
+    def count_known_jobs(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM known_jobs").fetchone()[0]
+
+    def is_known_job(self, job: tuple[str, str]) -> bool:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT 1 FROM known_jobs WHERE title = ? AND link = ?", job
+            ).fetchone()
+
+        return row is not None
+
+    def get_new_jobs(self, open_jobs: set[tuple[str, str]]) -> set[tuple[str, str]]:
+        with self._lock, self._connection:
+            self._fill_open_jobs_table(open_jobs)
+            rows = self._connection.execute(
+                "SELECT o.title, o.link FROM temp.open_jobs o WHERE NOT EXISTS ("
+                "SELECT 1 FROM known_jobs k WHERE k.title = o.title AND k.link = o.link)"
+            ).fetchall()
+
+        return set(rows)
+
+    def replace_known_jobs_partition(self, source: str, jobs: set[tuple[str, str]]) -> PartitionDelta:
+        # Only delete jobs which are no longer open and only
+        # insert jobs which are new, all in one transaction
+        with self._lock, self._connection:
+            self._fill_open_jobs_table(jobs)
+
+            added = self._connection.execute(
+                "SELECT o.title, o.link FROM temp.open_jobs o WHERE NOT EXISTS ("
+                "SELECT 1 FROM known_jobs k WHERE k.source = ? AND k.title = o.title AND k.link = o.link)",
+                (source,)
+            ).fetchall()
+
+            removed = self._connection.execute(
+                "DELETE FROM known_jobs WHERE source = ? AND NOT EXISTS ("
+                "SELECT 1 FROM temp.open_jobs o WHERE o.title = known_jobs.title AND o.link = known_jobs.link)",
+                (source,)
+            ).rowcount
+
+            self._connection.executemany(
+                "INSERT INTO known_jobs VALUES (?, ?, ?)", ((source, title, link) for title, link in added)
+            )
+
+            if source != legacy_partition:
+                self._connection.execute(
+                    "DELETE FROM known_jobs WHERE source = ? AND EXISTS ("
+                    "SELECT 1 FROM temp.open_jobs o WHERE o.title = known_jobs.title AND o.link = known_jobs.link)",
+                    (legacy_partition,)
+                )
+
+        return PartitionDelta(set(added), removed)
+
+    def add_to_known_jobs_partition(self, source: str, jobs: set[tuple[str, str]]) -> PartitionDelta:
+        with self._lock, self._connection:
+            self._fill_open_jobs_table(jobs)
+
+            added = self._connection.execute(
+                "SELECT o.title, o.link FROM temp.open_jobs o WHERE NOT EXISTS ("
+                "SELECT 1 FROM known_jobs k WHERE k.source = ? AND k.title = o.title AND k.link = o.link)",
+                (source,)
+            ).fetchall()
+
+            self._connection.executemany(
+                "INSERT INTO known_jobs VALUES (?, ?, ?)", ((source, title, link) for title, link in added)
+            )
+
+            if source != legacy_partition:
+                self._connection.execute(
+                    "DELETE FROM known_jobs WHERE source = ? AND EXISTS ("
+                    "SELECT 1 FROM temp.open_jobs o WHERE o.title = known_jobs.title AND o.link = known_jobs.link)",
+                    (legacy_partition,)
+                )
+
+        return PartitionDelta(set(added), 0)
+
+    def import_jobs(self, keywords: set, known_jobs: dict[str, set], subscriptions: set[tuple[str, int, str]]):
+        """
+        Adds the given keywords, partitions of known jobs and
+        subscriptions to the database in a single transaction.
+        Used to migrate from the JSON backend, so importing
+        the same data twice is harmless.
+        """
+        with self._lock, self._connection:
+            self._connection.executemany("INSERT OR IGNORE INTO keywords VALUES (?)", ((k,) for k in keywords))
+            self._connection.executemany("INSERT OR IGNORE INTO subscriptions VALUES (?, ?, ?)", subscriptions)
+
+            for source, jobs in known_jobs.items():
+                self._connection.executemany(
+                    "INSERT OR IGNORE INTO known_jobs VALUES (?, ?, ?)",
+                    ((source, title, link) for title, link in jobs)
+                )
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+class FingerprintSet:
+    """
+    A sorted array of fingerprints, which can be tested
+    for jobs like a set of jobs.
+    """
+
+    fingerprints: array
+
+    def __init__(self, fingerprints: array):
+        self.fingerprints = fingerprints
+
+    def __contains__(self, job) -> bool:
+        return contains_fingerprint(self.fingerprints, get_fingerprint(job))
+
+    def __len__(self) -> int:
+        return len(self.fingerprints)
+
+
+class FingerprintJobStore(JobStore):
+    """
+    Keeps a 64-bit fingerprint of every known job rather
+    than its title and link, in one sorted array per
+    partition, so membership tests are binary searches
+    and a million jobs take up 8 MB. Arrays are saved to
+    a binary file, which is loaded with a single read.
+    Keywords and subscriptions stay in the StorageObject.
+
+    Changes are written together with the storage file,
+    by the given mark_dirty function (see take_unsaved_file()).
+
+    Jobs can't be recovered from their fingerprints, so
+    get_known_jobs() returns a FingerprintSet.
+    """
+
+    _path: str
+    _storage_object: object
+    _mark_dirty: Callable[[], None]
+    _partitions: dict[str, array]
+    _dirty: bool
+
+    def __init__(self, path: str, storage_object, mark_dirty: Callable[[], None]):
+        self._path = path
+        self._storage_object = storage_object
+        self._mark_dirty = mark_dirty
+        self._partitions = dict()
+        self._dirty = False
+
+        try:
+            file = open(path, "rb")
+            data = file.read()
+            file.close()
+        except FileNotFoundError:
+            return
+
+        self._partitions = self._decode(data)
+
+    def _decode(self, data: bytes) -> dict[str, array]:
+        view = memoryview(data)
+        magic, version, num_partitions = fingerprint_file_header.unpack_from(view, 0)
+
+        if magic != fingerprint_file_magic or version != fingerprint_file_version:
+            raise Exception(f"{self._path} is not a known jobs fingerprint file!")
+
+        offset = fingerprint_file_header.size
+        partitions = dict()
+
+        for _ in range(num_partitions):
+            name_length, length = fingerprint_partition_header.unpack_from(view, offset)
+            offset += fingerprint_partition_header.size
+
+            name = bytes(view[offset:offset + name_length]).decode("utf-8")
+            offset += name_length
+
+            fingerprints = array("Q")
+            fingerprints.frombytes(view[offset:offset + length * fingerprints.itemsize])
+            offset += length * fingerprints.itemsize
+
+            if sys.byteorder != "little":
+                fingerprints.byteswap()
+
+            partitions[name] = fingerprints
+
+        return partitions
+
+    def _encode(self) -> bytes:
+        """Encodes every partition in the format of the fingerprint file."""
+
+        chunks = [fingerprint_file_header.pack(
+            fingerprint_file_magic, fingerprint_file_version, len(self._partitions)
+        )]
+
+        for name, fingerprints in self._partitions.items():
+            encoded_name = name.encode("utf-8")
+            chunks.append(fingerprint_partition_header.pack(len(encoded_name), len(fingerprints)))
+            chunks.append(encoded_name)
+
+            if sys.byteorder != "little":
+                fingerprints = array("Q", fingerprints)
+                fingerprints.byteswap()
+
+            chunks.append(fingerprints.tobytes())
+
+        return b"".join(chunks)
+
+    def _save(self):
+        """Schedules every partition to be written with the storage file."""
+
+        self._dirty = True
+        self._mark_dirty()
+
+    def take_unsaved_file(self) -> tuple[str, bytes] | None:
+        if not self._dirty:
+            return None
+
+        self._dirty = False
+        return self._path, self._encode()
+
+    def mark_unsaved(self):
+        self._dirty = True
+
+    def _is_known_fingerprint(self, fingerprint: int) -> bool:
+        for fingerprints in self._partitions.values():
+            if contains_fingerprint(fingerprints, fingerprint):
+                return True
+
+        return False
+
+    def _claim_legacy_fingerprints(self, source: str, claimed: set[int]) -> bool:
+        """
+        Removes the claimed fingerprints from the legacy
+        partition.
+
+        :return: True if any were removed.
+        """
+
+        legacy = self._partitions.get(legacy_partition)
+
+        if legacy is None or source == legacy_partition:
+            return False
+
+        if not any(contains_fingerprint(legacy, fingerprint) for fingerprint in claimed):
+            return False
+
+        legacy = array("Q", (fingerprint for fingerprint in legacy if fingerprint not in claimed))
+
+        if len(legacy) == 0:
+            del self._partitions[legacy_partition]
+        else:
+            self._partitions[legacy_partition] = legacy
+
+        return True
+
+    def get_keywords(self) -> set:
+        return self._storage_object.keywords
+
+    def add_keyword(self, keyword: str) -> bool:
+        if keyword in self._storage_object.keywords:
+            return False
+
+        self._storage_object.keywords.add(keyword)
+        self._mark_dirty()
+        return True
+
+    def del_keyword(self, keyword: str) -> bool:
+        try:
+            self._storage_object.keywords.remove(keyword)
+        except KeyError:
+            return False
+
+        self._mark_dirty()
+        return True
+
+    def get_subscriptions(self) -> set[tuple[str, int, str]]:
+        return self._storage_object.subscriptions
+
+    def add_subscription(self, subscription: tuple[str, int, str]) -> bool:
+        if subscription in self._storage_object.subscriptions:
+            return False
+
+        self._storage_object.subscriptions.add(subscription)
+        self._mark_dirty()
+        return True
+
+    def del_subscription(self, subscription: tuple[str, int, str]) -> bool:
+        try:
+            self._storage_object.subscriptions.remove(subscription)
+        except KeyError:
+            return False
+
+        self._mark_dirty()
+        return True
+
+    def get_known_jobs(self) -> FingerprintSet:
+        fingerprints = set()
+
+        for partition in self._partitions.values():
+            fingerprints.update(partition)
+
+        return FingerprintSet(array("Q", sorted(fingerprints)))
+
+    def get_known_jobs_partition(self, source: str) -> FingerprintSet:
+        return FingerprintSet(self._partitions.get(source, array("Q")))
+
+    def count_known_jobs(self) -> int:
+        return sum(len(partition) for partition in self._partitions.values())
+
+    def is_known_job(self, job: tuple[str, str]) -> bool:
+        return self._is_known_fingerprint(get_fingerprint(job))
+
+    def get_new_jobs(self, open_jobs: set[tuple[str, str]]) -> set[tuple[str, str]]:
+        return {job for job in open_jobs if not self._is_known_fingerprint(get_fingerprint(job))}
+
+    def replace_known_jobs_partition(self, source: str, jobs: set[tuple[str, str]]) -> PartitionDelta:
+        old_fingerprints = self._partitions.get(source, array("Q"))
+        fingerprints = {job: get_fingerprint(job) for job in jobs}
+        new_fingerprints = set(fingerprints.values())
+
+        added = {
+            job for job, fingerprint in fingerprints.items() if not contains_fingerprint(old_fingerprints, fingerprint)
+        }
+        num_kept = sum(1 for fingerprint in new_fingerprints if contains_fingerprint(old_fingerprints, fingerprint))
+        delta = PartitionDelta(added, len(old_fingerprints) - num_kept)
+
+        claimed_legacy = self._claim_legacy_fingerprints(source, new_fingerprints)
+
+        if delta.is_empty() and not claimed_legacy:
+            return delta
+
+        self._partitions[source] = array("Q", sorted(new_fingerprints))
+        self._save()
+        return delta
+
+    def add_to_known_jobs_partition(self, source: str, jobs: set[tuple[str, str]]) -> PartitionDelta:
+        fingerprints = self._partitions.get(source, array("Q"))
+        job_fingerprints = {get_fingerprint(job): job for job in jobs}
+        added = {
+            fingerprint: job for fingerprint, job in job_fingerprints.items()
+            if not contains_fingerprint(fingerprints, fingerprint)
+        }
+
+        # Jobs this source already knew may still be in the
+        # legacy partition too
+        claimed_legacy = self._claim_legacy_fingerprints(source, set(job_fingerprints))
+
+        if len(added) == 0 and not claimed_legacy:
+            return PartitionDelta(set(), 0)
+
+        # Scraper threads may be searching the current array
+        # (see get_known_jobs_partition()), so it's never
+        # changed in place, a new one is swapped in instead
+        if len(added) <= max_fingerprint_insertions:
+            fingerprints = array("Q", fingerprints)
+            for fingerprint in added:
+                insort(fingerprints, fingerprint)
+        else:
+            fingerprints = array("Q", sorted(set(fingerprints) | set(added)))
+
+        self._partitions[source] = fingerprints
+        self._save()
+        return PartitionDelta(set(added.values()), 0)
+
+    def import_jobs(self, known_jobs: dict[str, set]):
+        """
+        Adds the given partitions of known jobs, which are
+        left unsaved until take_unsaved_file() is called.
+        Used to convert from the JSON backend, so importing
+        the same jobs twice is harmless.
+        """
+
+        for source, jobs in known_jobs.items():
+            fingerprints = set(self._partitions.get(source, array("Q")))
+            fingerprints.update(get_fingerprint(job) for job in jobs)
+            self._partitions[source] = array("Q", sorted(fingerprints))
+
+        self._dirty = True
@@ -2,108 +2,336 @@
 Jobs Check | Written by Joshua Sheldon
 
 Contains the logic for checking for new jobs.
-jobs_check() runs all scrapers, determines which
+run_jobs_check() runs all scrapers concurrently,
+normalizes the jobs they found, determines which
 open jobs are new, filters new jobs by keywords
 (if they exist), and returns the filtered set.
+new_jobs_check() does the same, but only returns
+the new jobs.
 """
 
 # ---------- IMPORTS ----------
 
+# Python Default Imports
+import time
+
 # Local Imports
-from abstract_scraper import AbstractScraper
+from abstract_scraper import AbstractScraper, StreamingAbstractScraper
+from check_profiler import get_check_profiler
+from fetch_cache import save_fetch_cache
+from job_normalization import deduplicate_jobs
+from keyword_matcher import KeywordMatcher
+import metrics
+from notification_outbox import NotificationOutbox
 from persistent_storage import Storage
+from scraper_health import get_health_tracker, state_closed
+from scraper_process_pool import ScraperProcessPool, get_scraper_process_pool
+from scraper_runner import (
+    ScraperResult, execution_mode_process, get_scraper_name, log_result, outcome_error, outcome_skipped, run_scrapers
+)
+
+# ---------- CONSTANTS ----------
+
+# When (on the monotonic clock) each streaming scraper
+# last scraped every page
+_last_full_sweeps: dict[str, float] = {}
 
-# ---------- METHODS ----------
+# ---------- CLASSES & METHODS ----------
 
 
-def filter_jobs_with_keywords(new_jobs: set[tuple[str, str]], keywords: set) -> set[tuple[str, str]]:
+class CheckResult:
     """
-    Given a set of new jobs and keywords, returns a
-    set of new jobs, where each job's title includes
-    at least one of the given keywords.
+    The result of a check for new jobs: the new (and
+    potentially filtered) jobs, every new job before
+    filtering (which subscriptions are matched against),
+    and the result of every scraper which was run.
     """
 
-    filtered_new_jobs = set()
+    # Instance Variables
+    new_jobs: set[tuple[str, str]]
+    unfiltered_new_jobs: set[tuple[str, str]]
+    scraper_results: list[ScraperResult]
 
-    for job in new_jobs:
-        # Make job name lowercase, as keywords
-        # are case-insensitive (for simplicity)
-        job_name = job[0].lower()
-        match = False
+    def __init__(self, new_jobs, scraper_results, unfiltered_new_jobs=None):
+        self.new_jobs = new_jobs
+        self.scraper_results = scraper_results
+        self.unfiltered_new_jobs = new_jobs if unfiltered_new_jobs is None else unfiltered_new_jobs
 
-        # Assume all keywords are lowercase,
-        # because they are
-        for keyword in keywords:
-            if keyword in job_name:
-                match = True
-                break
 
-        if match:
-            filtered_new_jobs.add(job)
 
-    return filtered_new_jobs
+def filter_jobs_with_keywords(new_jobs: set[tuple[str, str]], matcher: KeywordMatcher) -> set[tuple[str, str]]:
+    """
+    Given a set of new jobs and compiled keywords, returns
+    a set of new jobs, where each job's title includes
+    at least one of the keywords. Keywords are
+    case-insensitive (for simplicity).
+    """
+
+    return {job for job in new_jobs if matcher.matches(job[0])}
 
 
 def new_jobs_check(scrapers: set[AbstractScraper], storage: Storage) -> set[tuple[str, str]]:
     """
-    Given a set of scrapers, use all of them to check for
-    open jobs. Then, compare all open jobs with all known
-    jobs. If any open jobs are new, then filter them based
-    on keywords if any keywords are defined, and return
-    the filtered set of new jobs.
+    Runs a check for new jobs (see run_jobs_check()), and
+    returns only the new (and potentially filtered) jobs.
+    """
+    return run_jobs_check(scrapers, storage).new_jobs
+
+
+def run_jobs_check(
+        scrapers: set[AbstractScraper],
+        storage: Storage,
+        outbox: NotificationOutbox | None = None
+) -> CheckResult:
+    """
+    Given a set of scrapers, use all of them (concurrently)
+    to check for open jobs. Then, compare all open jobs with
+    all known jobs. If any open jobs are new, then filter
+    them based on keywords if any keywords are defined,
+    and return the filtered set of new jobs.
 
     This method also updates the list of known jobs once
-    the new ones are identified.
+    the new ones are identified. Known jobs are kept per
+    scraper, and only the known jobs of scrapers which
+    succeeded (and found at least one job) are replaced,
+    so a failing scraper's jobs aren't forgotten and then
+    reported as new once it recovers. Scrapers which keep
+    failing are skipped for a while, and keep their known
+    jobs too. Streaming scrapers which stopped early only
+    add to their known jobs.
+
+    If an outbox is given, new jobs are queued in it to be
+    sent to every active channel before they become known
+    jobs, so they're never lost, even if the bot crashes.
     """
 
-    # For each scraper, scrape the open jobs and add them
-    # to cumulative list of open jobs
-    open_jobs = set()
+    check_start = time.monotonic()
+
+    try:
+        # Profiled only once the profiler is armed
+        with get_check_profiler().profile_check():
+            return _run_jobs_check(scrapers, storage, outbox)
+    finally:
+        metrics.check_duration.observe(time.monotonic() - check_start)
+
+
+def record_scraper_metrics(results: list[ScraperResult]):
+    for result in results:
+        metrics.scraper_runs.inc(1, result.name, result.outcome)
+
+        # Skipped scrapers didn't run
+        if result.outcome == outcome_skipped:
+            continue
+
+        metrics.scraper_duration.observe(result.duration_in_s, result.name)
+
+        if result.is_ok():
+            metrics.scraper_jobs_returned.set(len(result.jobs), result.name)
+
+
+def get_scrapers_to_run(scrapers: set[AbstractScraper]) -> tuple[set[AbstractScraper], list[ScraperResult]]:
+    """
+    Leaves out scrapers whose circuit is open (see
+    scraper_health.py).
+
+    :return: The scrapers to run, and a result for every
+             scraper which was skipped.
+    """
+
+    tracker = get_health_tracker()
+    scrapers_to_run = set()
+    skipped_results = []
 
     for scraper in scrapers:
-        # Arbitrary code execution, wrap in try/catch
+        name = get_scraper_name(scraper)
+
+        if tracker.should_run(name):
+            scrapers_to_run.add(scraper)
+        else:
+            skipped_results.append(ScraperResult(name, outcome_skipped, set(), 0.0))
+            log_result(skipped_results[-1])
+
+    return scrapers_to_run, skipped_results
+
+
+def record_scraper_health(results: list[ScraperResult]):
+    tracker = get_health_tracker()
+
+    for result in results:
+        tracker.record(result)
+
+    for health in tracker.get_health():
+        metrics.scraper_circuit_open.set(0 if health.state == state_closed else 1, health.name)
+
+
+def get_process_pool(storage: Storage) -> ScraperProcessPool | None:
+    """Returns the process pool scrapers run in, if there is one."""
+
+    if storage.get_scraper_execution_mode() != execution_mode_process:
+        return None
+
+    return get_scraper_process_pool(
+        storage.get_max_concurrent_scrapers(),
+        storage.get_scraper_timeout_in_s(),
+        storage.get_worker_memory_limit_in_mb(),
+        storage.get_max_tasks_per_worker()
+    )
+
+
+def get_known_jobs_to_stop_at(scrapers: set[AbstractScraper], storage: Storage) -> dict[AbstractScraper, set]:
+    """
+    Returns the known jobs each streaming scraper should
+    stop at. Scrapers which are due a full sweep are left
+    out, so they scrape every page.
+    """
+
+    now = time.monotonic()
+    known_jobs = {}
+
+    for scraper in scrapers:
+        if not isinstance(scraper, StreamingAbstractScraper):
+            continue
+
+        last_full_sweep = _last_full_sweeps.get(get_scraper_name(scraper))
+        if last_full_sweep is None or now - last_full_sweep >= scraper.full_sweep_interval_in_s:
+            continue
+
+        known_jobs[scraper] = storage.get_known_jobs_partition(get_scraper_name(scraper))
+
+    return known_jobs
+
+
+def normalize_results(scrapers: set[AbstractScraper], results: list[ScraperResult]) -> dict[tuple, tuple]:
+    """
+    Replaces the jobs of every successful result with their
+    normalized form (see AbstractScraper.normalize_job()).
+    A scraper whose normalization fails is marked failed.
+
+    :return: The job each normalized job was normalized
+             from, for jobs which normalization changed.
+    """
+
+    scrapers_by_name = {get_scraper_name(scraper): scraper for scraper in scrapers}
+    original_jobs = {}
+
+    for result in results:
+        scraper = scrapers_by_name.get(result.name)
+        if not result.is_ok() or scraper is None:
+            continue
+
         try:
-            scraper_open_jobs = scraper.scrape_open_jobs()
-            for job in scraper_open_jobs:
-                open_jobs.add(job)
+            normalized_jobs = set()
+
+            for job in result.jobs:
+                normalized_job = scraper.normalize_job(job[0], job[1])
+                normalized_jobs.add(normalized_job)
+
+                if normalized_job != job:
+                    original_jobs[normalized_job] = job
+
+            result.jobs = normalized_jobs
         except Exception as e:
-            print(f"Exception in scraper: {e}")
+            # Scrapers can override normalization
+            print(f"Exception normalizing jobs of scraper {result.name}: {e}")
+            result.outcome = outcome_error
+            result.error = e
+            result.jobs = set()
+
+    return original_jobs
+
+
+def _run_jobs_check(scrapers: set[AbstractScraper], storage: Storage, outbox: NotificationOutbox | None) -> CheckResult:
+    # Run all scrapers concurrently, and add the open
+    # jobs of every successful scraper to the cumulative
+    # list of open jobs
+    run_start = time.monotonic()
+    scrapers_to_run, skipped_results = get_scrapers_to_run(scrapers)
+    results = run_scrapers(
+        scrapers_to_run,
+        storage.get_max_concurrent_scrapers(),
+        storage.get_scraper_timeout_in_s(),
+        storage.get_check_deadline_in_s(),
+        get_process_pool(storage),
+        get_known_jobs_to_stop_at(scrapers_to_run, storage)
+    )
+
+    original_jobs = normalize_results(scrapers_to_run, results)
+    record_scraper_health(results)
+
+    results.extend(skipped_results)
+    record_scraper_metrics(results)
+
+    # Scrapers may have fetched pages through the fetch cache
+    save_fetch_cache()
+
+    open_jobs = set()
+    successful_results = []
+
+    for result in results:
+        if result.is_ok() and result.complete:
+            _last_full_sweeps[result.name] = run_start
+
+        if result.is_ok() and len(result.jobs) > 0:
+            open_jobs.update(result.jobs)
+            successful_results.append(result)
 
     # Make sure we got at least one open job
     if len(open_jobs) < 1:
-        return open_jobs
+        return CheckResult(open_jobs, results)
 
     # Now we know we have at least one open job,
-    # let's see if any of them are new
-    known_jobs = storage.get_known_jobs()
-    new_jobs = set()
+    # let's see if any of them are new (to any
+    # scraper, not just the one which found them)
+    new_jobs = storage.get_new_jobs(open_jobs)
+
+    # Jobs known by the form they had before they were
+    # normalized (ex. before normalization was introduced)
+    # aren't new either
+    unnormalized_jobs = {original_jobs[job] for job in new_jobs if job in original_jobs}
+    if len(unnormalized_jobs) > 0:
+        new_unnormalized_jobs = storage.get_new_jobs(unnormalized_jobs)
+        new_jobs = {
+            job for job in new_jobs if job not in original_jobs or original_jobs[job] in new_unnormalized_jobs
+        }
+
+    for result in successful_results:
+        result.num_new_jobs = len(result.jobs & new_jobs)
+
+    # The same job may have been found by several scrapers
+    new_jobs = deduplicate_jobs(new_jobs)
+
+    # Queue the new jobs before they become known, so
+    # they're sent even if the bot stops right after
+    if outbox is not None and len(new_jobs) > 0:
+        outbox.enqueue(new_jobs, storage.get_active_channels())
 
-    # Collect all new jobs by iterating through
-    # all currently open jobs and adding all
-    # which are not already known to the set
-    for job in open_jobs:
-        if job not in known_jobs:
-            new_jobs.add(job)
+    # Update the known jobs of every successful scraper
+    for result in successful_results:
+        if result.complete:
+            delta = storage.replace_known_jobs_partition(result.name, result.jobs)
+        else:
+            delta = storage.add_to_known_jobs_partition(result.name, result.jobs)
 
-    # Update list of known jobs
-    storage.set_known_jobs(open_jobs)
+        if not delta.is_empty():
+            print(f"Scraper {result.name}: {len(delta.added)} job(s) added, {delta.num_removed} job(s) removed.")
 
     num_of_new_jobs = len(new_jobs)
     print(f"Detected {num_of_new_jobs} new job(s).")
+    metrics.new_jobs_found.inc(num_of_new_jobs)
 
     if num_of_new_jobs == 0:
         # Nothing more to do if there are no new jobs
-        return new_jobs
+        return CheckResult(new_jobs, results)
 
     # If we have set keywords, we only want
     # to notify the user of new jobs that
     # contain one of the keywords
-    keywords = storage.get_keywords()
+    matcher = storage.get_keyword_matcher()
 
-    if len(keywords) > 0:
-        filtered_new_jobs = filter_jobs_with_keywords(new_jobs, keywords)
+    if len(matcher) > 0:
+        filtered_new_jobs = filter_jobs_with_keywords(new_jobs, matcher)
     else:
         filtered_new_jobs = new_jobs
 
     # Return new jobs, filtered or not
-    return filtered_new_jobs
+    return CheckResult(filtered_new_jobs, results, new_jobs)
@@ -0,0 +1,126 @@
+"""
+Keyword Matcher | Written by Joshua Sheldon
+
+Compiles a set of keywords into a single Aho-Corasick
+automaton, so a job title can be checked against every
+keyword in one pass over the title, no matter how many
+keywords there are. The same pass can also find which
+keywords appear, to route jobs to whoever subscribed
+to those keywords.
+"""
+
+# ---------- IMPORTS ----------
+
+# Python Default Imports
+from collections import deque
+from typing import Iterable
+
+# ---------- CLASSES ----------
+
+
+class KeywordMatcher:
+    """
+    Matches text against a fixed set of lowercase keywords.
+    A piece of text matches if any keyword is a substring
+    of the lowercased text, the same as checking
+    "keyword in text.lower()" for every keyword.
+    """
+
+    # Instance Variables
+    _keywords: frozenset
+    _goto: list[dict[str, int]]
+    _fail: list[int]
+    _output: list[frozenset]
+
+    def __init__(self, keywords: Iterable[str]):
+        self._keywords = frozenset(keywords)
+
+        # State 0 is the root. Every state has a dictionary of
+        # transitions, and the keywords which end at it.
+        self._goto = [{}]
+        outputs = [set()]
+
+        for keyword in self._keywords:
+            state = 0
+            for char in keyword:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    outputs.append(set())
+                state = next_state
+            outputs[state].add(keyword)
+
+        # Breadth-first, point every state at the state for the
+        # longest proper suffix of its path which is also a
+        # path in the trie, and inherit that state's keywords
+        self._fail = [0] * len(self._goto)
+        queue = deque(self._goto[0].values())
+
+        while len(queue) > 0:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+
+                fallback = self._fail[state]
+                while fallback != 0 and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+
+                target = self._goto[fallback].get(char, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                outputs[next_state] |= outputs[self._fail[next_state]]
+
+        self._output = [frozenset(output) for output in outputs]
+
+    def __len__(self) -> int:
+        return len(self._keywords)
+
+    def matches(self, text: str) -> bool:
+        """
+        :return: True if any keyword appears in the text.
+        """
+
+        # The empty keyword matches everything
+        if len(self._output[0]) > 0:
+            return True
+
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        state = 0
+
+        for char in text.lower():
+            while state != 0 and char not in goto[state]:
+                state = fail[state]
+
+            state = goto[state].get(char, 0)
+
+            if output[state]:
+                return True
+
+        return False
+
+    def find_matches(self, text: str) -> set[str]:
+        """
+        :return: Every keyword which appears in the text.
+        """
+
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        state = 0
+
+        # The empty keyword matches everything
+        found = set(output[0])
+
+        for char in text.lower():
+            while state != 0 and char not in goto[state]:
+                state = fail[state]
+
+            state = goto[state].get(char, 0)
+
+            if output[state]:
+                found.update(output[state])
+
+        return found
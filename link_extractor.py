@@ -0,0 +1,297 @@
+"""
+Link Extractor | Written by Joshua Sheldon
+
+Pulls job links out of HTML as it's read, for the
+common kind of scraper which looks for every link on
+a listing page that points to a job. The page is fed
+to a streaming parser in chunks, and each matching
+link comes out as a (title, link) tuple as soon as
+its closing tag is read. No document tree is built,
+so big listing pages take a fraction of the time and
+memory BeautifulSoup would need.
+
+Links are resolved against the page's URL (or its
+<base> element), then kept if they match every rule
+given: a URL prefix, a regular expression, and a
+simple CSS selector (ex. "ul.jobs a.posting").
+"""
+
+# ---------- IMPORTS ----------
+
+# Python Default Imports
+import codecs
+from html.parser import HTMLParser
+import re
+from typing import Iterable, Iterator
+from urllib.parse import urljoin
+
+# Local Imports
+from polite_http import polite_get
+
+# ---------- CONSTANTS ----------
+
+# Elements which never have a closing tag
+void_elements = frozenset({
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param", "source", "track", "wbr"
+})
+
+# One compound selector, ex. "a.posting" or "#jobs"
+compound_selector_pattern = re.compile(r"^([a-zA-Z][a-zA-Z0-9-]*|\*)?((?:[.#][\w-]+)*)$")
+
+# How much of a streamed page is read at once
+chunk_size = 64 * 1024
+
+# ---------- CLASSES & METHODS ----------
+
+
+class CompoundSelector:
+    """A tag name, ID and classes an element must all have."""
+
+    # Instance Variables
+    tag: str | None
+    id: str | None
+    classes: frozenset[str]
+
+    def __init__(self, text: str):
+        match = compound_selector_pattern.match(text)
+        if match is None:
+            raise ValueError(f"Unsupported selector: {text}")
+
+        tag = match.group(1)
+        self.tag = None if tag is None or tag == "*" else tag.lower()
+        self.id = None
+
+        classes = set()
+        for part in re.findall(r"[.#][\w-]+", match.group(2)):
+            if part[0] == "#":
+                self.id = part[1:]
+            else:
+                classes.add(part[1:])
+
+        self.classes = frozenset(classes)
+
+    def matches(self, tag: str, element_id: str | None, classes: frozenset[str]) -> bool:
+        return ((self.tag is None or self.tag == tag)
+                and (self.id is None or self.id == element_id)
+                and self.classes <= classes)
+
+
+def parse_selector(selector: str) -> list[CompoundSelector]:
+    """
+    Parses a selector made of compound selectors (a tag,
+    "#id" and ".class", ex. "div.jobs") separated by spaces,
+    where each must match an ancestor of the next. Other
+    combinators and attribute selectors aren't supported.
+    """
+
+    parts = selector.split()
+    if len(parts) == 0:
+        raise ValueError("Empty selector")
+
+    return [CompoundSelector(part) for part in parts]
+
+
+class LinkExtractor(HTMLParser):
+    """
+    A streaming HTML parser which collects matching links.
+    Feed it chunks of a page with feed(), and take the links
+    found so far with pop_links().
+    """
+
+    _base_url: str
+    _prefix: str | None
+    _pattern: re.Pattern | None
+    _selector: list[CompoundSelector] | None
+    _stack: list[tuple[str, str | None, frozenset[str]]]
+    _link: str | None
+    _link_matches: bool
+    _title_parts: list[str]
+    _links: list[tuple[str, str]]
+
+    def __init__(
+            self,
+            base_url: str,
+            prefix: str | None = None,
+            pattern: str | re.Pattern | None = None,
+            selector: str | None = None
+    ):
+        """
+        :param base_url: The URL of the page, which relative
+                         links are resolved against.
+        :param prefix: If given, only links (once resolved)
+                       which start with it are kept.
+        :param pattern: If given, only links (once resolved)
+                        which it matches are kept.
+        :param selector: If given, only links whose <a>
+                         element it matches are kept. The
+                         last compound selector must match
+                         the <a> element itself.
+        """
+        super().__init__(convert_charrefs=True)
+
+        self._base_url = base_url
+        self._prefix = prefix
+        self._pattern = re.compile(pattern) if isinstance(pattern, str) else pattern
+        self._selector = None if selector is None else parse_selector(selector)
+
+        # Open elements (tag, ID, classes) the link is inside
+        # of, only kept track of when there's a selector
+        self._stack = []
+
+        self._link = None
+        self._link_matches = False
+        self._title_parts = []
+        self._links = []
+
+    def _matches_selector(self, element: tuple[str, str | None, frozenset[str]]) -> bool:
+        """Matches the selector against the element, and its open ancestors."""
+
+        if self._selector is None:
+            return True
+
+        if not self._selector[-1].matches(*element):
+            return False
+
+        # Match the rest of the selector against ancestors,
+        # from the closest outwards
+        remaining = len(self._selector) - 2
+        for ancestor in reversed(self._stack):
+            if remaining < 0:
+                break
+
+            if self._selector[remaining].matches(*ancestor):
+                remaining -= 1
+
+        return remaining < 0
+
+    def _matches_link(self, link: str) -> bool:
+        if self._prefix is not None and not link.startswith(self._prefix):
+            return False
+
+        if self._pattern is not None and self._pattern.search(link) is None:
+            return False
+
+        return True
+
+    def _finish_link(self):
+        if self._link is not None and self._link_matches:
+            self._links.append((" ".join("".join(self._title_parts).split()), self._link))
+
+        self._link = None
+        self._link_matches = False
+        self._title_parts = []
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, str | None]]):
+        # Without a selector, only links (and <base>) matter
+        if self._selector is None and tag != "a" and tag != "base":
+            return
+
+        attributes = dict(attrs)
+
+        if tag == "base" and attributes.get("href"):
+            self._base_url = urljoin(self._base_url, attributes["href"].strip())
+            return
+
+        element = (tag, attributes.get("id"), frozenset((attributes.get("class") or "").split()))
+
+        if tag == "a":
+            # Links can't be nested, an unclosed link ends here
+            self._finish_link()
+
+            href = attributes.get("href")
+            if href is not None:
+                self._link = urljoin(self._base_url, href.strip())
+                self._link_matches = self._matches_link(self._link) and self._matches_selector(element)
+
+        if self._selector is not None and tag not in void_elements:
+            self._stack.append(element)
+
+    def handle_endtag(self, tag: str):
+        if tag == "a":
+            self._finish_link()
+
+        # Close the element, and any unclosed elements
+        # inside of it. Stray closing tags are ignored.
+        for i in range(len(self._stack) - 1, -1, -1):
+            if self._stack[i][0] == tag:
+                del self._stack[i:]
+                break
+
+    def handle_data(self, data: str):
+        if self._link is not None:
+            self._title_parts.append(data)
+
+    def close(self):
+        super().close()
+        self._finish_link()
+
+    def pop_links(self) -> list[tuple[str, str]]:
+        """Returns the links found since the last call."""
+
+        links = self._links
+        self._links = []
+        return links
+
+
+def extract_links(
+        chunks: Iterable[str],
+        base_url: str,
+        prefix: str | None = None,
+        pattern: str | re.Pattern | None = None,
+        selector: str | None = None
+) -> Iterator[tuple[str, str]]:
+    """
+    Parses HTML from an iterable of text chunks (a whole page
+    is a single chunk), and yields every matching link as a
+    (title, link) tuple as soon as it's read. See
+    LinkExtractor for the arguments.
+    """
+
+    extractor = LinkExtractor(base_url, prefix, pattern, selector)
+
+    for chunk in chunks:
+        extractor.feed(chunk)
+        yield from extractor.pop_links()
+
+    extractor.close()
+    yield from extractor.pop_links()
+
+
+def stream_links(
+        url: str,
+        prefix: str | None = None,
+        pattern: str | re.Pattern | None = None,
+        selector: str | None = None,
+        **kwargs
+) -> Iterator[tuple[str, str]]:
+    """
+    Fetches a page (through the shared session, see
+    polite_http.py), and yields every matching link on it
+    while the page is still being downloaded. Other
+    keyword arguments are passed on to polite_get().
+
+    :raises requests.HTTPError: If the page couldn't be fetched.
+    """
+
+    response = polite_get(url, stream=True, **kwargs)
+
+    with response:
+        response.raise_for_status()
+
+        # requests assumes Latin-1 for pages without a
+        # charset, but they're almost always UTF-8
+        encoding = "utf-8"
+        if "charset" in response.headers.get("Content-Type", "").lower() and response.encoding is not None:
+            encoding = response.encoding
+
+        try:
+            decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+        except LookupError:
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+        def chunks() -> Iterator[str]:
+            for chunk in response.iter_content(chunk_size):
+                yield decoder.decode(chunk)
+            yield decoder.decode(b"", final=True)
+
+        yield from extract_links(chunks(), response.url, prefix, pattern, selector)
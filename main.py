@@ -4,89 +4,52 @@
 
 # Python Default Imports
 import asyncio
-import importlib
 from pathlib import Path
-import time
-from threading import Thread
-
-# Pip Sourced Imports
-import schedule
+import signal
 
 # Local Imports
-from abstract_scraper import AbstractScraper
+from adaptive_polling import PostingRateModel
+from check_profiler import get_check_profiler
+from check_scheduler import CheckScheduler
 from discord_interface import DiscordInterface
-from jobs_check import new_jobs_check
+from metrics import start_metrics_server
 from persistent_storage import Storage
-
-# ---------- CONSTANTS ----------
-
-scrapers_dir_name = "scrapers"
-scraper_class_name = "Scraper"
+from scraper_loader import ScraperLoader, scrapers_dir_name
 
 # ---------- METHODS ----------
 
-def check_and_notify(discord_interface: DiscordInterface, scrapers: set[AbstractScraper], storage: Storage):
+async def start_checks(
+        discord_interface: DiscordInterface,
+        loader: ScraperLoader,
+        scheduler: CheckScheduler,
+        storage: Storage
+):
     """
-    Retrieves all new (and potentially filtered) jobs, and
-    fires a Discord notification with all new jobs if there
-    are any.
+    Loads the scrapers and fills in the known jobs while
+    the Discord bot connects, then waits for the bot to
+    connect before running scheduled checks, so new jobs
+    can be posted as soon as they're found. Keeps the
+    scrapers in sync with the scrapers directory from
+    then on.
     """
-    new_jobs = new_jobs_check(scrapers, storage)
-
-    # If new jobs exist, notify everyone on Discord
-    if len(new_jobs) > 0:
-        asyncio.run_coroutine_threadsafe(
-            discord_interface.do_new_jobs_notif(new_jobs),
-            discord_interface.bot.loop
-        )
-
-
-def schedule_jobs_check(discord_interface: DiscordInterface, scrapers: set[AbstractScraper], storage: Storage):
-    """
-    Schedules a check for new jobs at the interval
-    defined in the storage file.
-    """
-    schedule.every(
-        storage.get_check_interval_in_s()
-    ).seconds.do(
-        check_and_notify, discord_interface, scrapers, storage
-    )
 
-    while True:
-        schedule.run_pending()
-        time.sleep(1)
+    await asyncio.to_thread(loader.sync)
 
+    if len(loader.scrapers) == 0:
+        raise Exception("No scrapers successfully loaded!")
 
-def load_scrapers_from_path(scrapers_path: Path) -> set[AbstractScraper]:
-    """
-    Iterates through all Python files in the "scrapers/" directory and
-    attempts to create new instances of the Scraper classes defined
-    within. These instances are collected into a set and returned by
-    this method.
-
-    :param scrapers_path: The location of all defined scrapers.
-    :return: A list of scrapers used to get open jobs.
-    """
-
-    scrapers = set()
-    for file in scrapers_path.glob("*.py"):
-        module_name = file.stem
-        try:
-            # Import file containing implemented scraper
-            module = importlib.import_module(f"{scrapers_dir_name}.{module_name}")
-
-            # Get implemented scraper class and create
-            # a new instance of the scraper
-            scraper_class = getattr(module, scraper_class_name)
-            scraper_instance = scraper_class()
-
-            # Add it to list of scrapers
-            scrapers.add(scraper_instance)
+    print(f"Successfully loaded {len(loader.scrapers)} scrapers!")
 
-        except Exception as e:
-            print(f"Failed to load scraper {module_name}:", e)
+    # Check if there are no currently known jobs.
+    # If so, initialize the list.
+    if storage.count_known_jobs() == 0:
+        # Run a new jobs check to attempt to fill out
+        # the known jobs list
+        print("No known jobs. Initializing list...")
+        await asyncio.wrap_future(discord_interface.fill_known_jobs())
 
-    return scrapers
+    await discord_interface.bot.wait_until_ready()
+    await asyncio.gather(loader.watch(), scheduler.run())
 
 
 async def main():
@@ -95,13 +58,11 @@ async def main():
     scrapers_path = Path(scrapers_dir_name)
     scrapers_path.mkdir(parents=True, exist_ok=True)
 
-    # Load scrapers
-    scrapers = load_scrapers_from_path(scrapers_path)
+    # Find scrapers, they're imported in the background
+    loader = ScraperLoader(scrapers_path)
 
-    if len(scrapers) > 0:
-        print(f"Successfully loaded {len(scrapers)} scrapers!")
-    else:
-        raise Exception("No scrapers successfully loaded!")
+    if len(loader.discover()) == 0:
+        raise Exception("No scrapers found!")
 
     # This raises an exception if a storage
     # file doesn't already exist.
@@ -109,32 +70,63 @@ async def main():
 
     print("Successfully read in storage from file!")
 
-    # Check if there are no currently known jobs.
-    # If so, initialize the list.
-    initial_known_jobs = storage.get_known_jobs()
-    if len(initial_known_jobs) == 0:
-        # Run a new jobs check to attempt to fill out
-        # the known jobs list
-        print("No known jobs. Initializing list...")
-        new_jobs_check(scrapers, storage)
+    if storage.get_metrics_port() > 0:
+        start_metrics_server(storage.get_metrics_port())
 
     # Initialize the Discord Interface early,
-    # so it can be passed into the jobs update
-    # thread
-    discord_interface = DiscordInterface(scrapers, storage)
-
-    # Schedule repeating task in a new thread
-    # because it has an infinite while loop
-    # in it, and we don't want to block the main
-    # thread (discord bot needs to run on it)
-    thread = Thread(
-        target=schedule_jobs_check,
-        args=(discord_interface, scrapers, storage)
+    # so the scheduler can run checks through it
+    discord_interface = DiscordInterface(loader.scrapers, storage)
+
+    # Schedule repeating checks on the same event
+    # loop the Discord bot runs on. The checks
+    # themselves run on a separate thread. Keep a
+    # reference to the task so it isn't collected.
+    rate_model = None
+    if storage.is_adaptive_polling_enabled():
+        rate_model = PostingRateModel(storage.get_min_check_interval_in_s(), storage.get_max_check_interval_in_s())
+
+    scheduler = CheckScheduler(
+        loader.scrapers,
+        storage.get_check_interval_in_s(),
+        discord_interface.run_check,
+        rate_model
     )
-    thread.start()
+    checks_task = asyncio.create_task(start_checks(discord_interface, loader, scheduler, storage))
+
+    # Stop the bot if checks can't start, for
+    # instance when no scraper could be loaded
+    def stop_if_checks_failed(task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            asyncio.ensure_future(discord_interface.bot.close())
+
+    checks_task.add_done_callback(stop_if_checks_failed)
+
+    # Profile the next check when sent SIGUSR1 (see
+    # check_profiler.py), where there are signals
+    if hasattr(signal, "SIGUSR1"):
+        asyncio.get_running_loop().add_signal_handler(signal.SIGUSR1, get_check_profiler().request, 1)
+
+    # Send new jobs from the outbox, including any
+    # left over from the last time the bot ran
+    delivery_task = asyncio.create_task(discord_interface.deliver_notifications())
+
+    # Run the bot. Once it stops, stop the checks and
+    # deliveries, and write any changes which haven't
+    # been written yet.
+    try:
+        await discord_interface.start_bot()
+    finally:
+        checks_task.cancel()
+        delivery_task.cancel()
+        await asyncio.gather(checks_task, delivery_task, return_exceptions=True)
+
+        storage.close()
 
-    # Run the bot
-    await discord_interface.start_bot()
+    if checks_task.done() and not checks_task.cancelled() and checks_task.exception() is not None:
+        raise checks_task.exception()
 
 
-asyncio.run(main())
+# Scraper worker processes import this module,
+# so only run the bot when it's run directly
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,245 @@
+"""
+Metrics | Written by Joshua Sheldon
+
+A small instrumentation layer. Records how long each
+scraper takes and how it ends, how many jobs it
+returns, how long checks take, how much storage
+writes cost, and how long Discord notifications take
+to send. Metrics are served in the Prometheus text
+format from a localhost HTTP endpoint, and summarized
+by the /stats command.
+"""
+
+# ---------- IMPORTS ----------
+
+# Python Default Imports
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+
+# ---------- CONSTANTS ----------
+
+# Upper bounds (in seconds) of the histogram buckets
+duration_buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+content_type = "text/plain; version=0.0.4; charset=utf-8"
+
+# ---------- CLASSES & METHODS ----------
+
+
+def format_labels(label_names: tuple, label_values: tuple, extra: str = "") -> str:
+    pairs = []
+
+    for name, value in zip(label_names, label_values):
+        escaped = str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+        pairs.append(f"{name}=\"{escaped}\"")
+
+    if extra != "":
+        pairs.append(extra)
+
+    if len(pairs) == 0:
+        return ""
+
+    return "{" + ",".join(pairs) + "}"
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+
+    return repr(float(value))
+
+
+class Metric:
+    """
+    A named metric with a value for every combination
+    of label values it has been recorded with.
+    """
+
+    name: str
+    help: str
+    type: str
+    label_names: tuple
+    _values: dict
+    _lock: Lock
+
+    def __init__(self, name: str, help: str, label_names: tuple = ()):
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        self._values = dict()
+        self._lock = Lock()
+        _registry.append(self)
+
+    def get_label_values(self) -> list[tuple]:
+        with self._lock:
+            return list(self._values)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+
+        with self._lock:
+            for label_values, value in self._values.items():
+                lines.extend(self._render_value(label_values, value))
+
+        return lines
+
+    def _render_value(self, label_values: tuple, value) -> list[str]:
+        return [f"{self.name}{format_labels(self.label_names, label_values)} {format_value(value)}"]
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount: float, *label_values):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def get(self, *label_values) -> float:
+        with self._lock:
+            return self._values.get(label_values, 0)
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, value: float, *label_values):
+        with self._lock:
+            self._values[label_values] = value
+
+    def get(self, *label_values) -> float:
+        with self._lock:
+            return self._values.get(label_values, 0)
+
+
+class Histogram(Metric):
+    """
+    Counts observations into cumulative buckets, and keeps
+    their sum and count. Values are [bucket counts, sum, count].
+    """
+
+    type = "histogram"
+    buckets: tuple
+
+    def __init__(self, name: str, help: str, label_names: tuple = (), buckets: tuple = duration_buckets):
+        super().__init__(name, help, label_names)
+        self.buckets = buckets + (float("inf"),)
+
+    def observe(self, value: float, *label_values):
+        with self._lock:
+            entry = self._values.get(label_values)
+
+            if entry is None:
+                entry = [[0] * len(self.buckets), 0.0, 0]
+                self._values[label_values] = entry
+
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+
+            entry[1] += value
+            entry[2] += 1
+
+    def get_sum_and_count(self, *label_values) -> tuple[float, int]:
+        with self._lock:
+            entry = self._values.get(label_values)
+
+            if entry is None:
+                return 0.0, 0
+
+            return entry[1], entry[2]
+
+    def _render_value(self, label_values: tuple, value) -> list[str]:
+        bucket_counts, total, count = value
+        lines = []
+
+        for bound, bucket_count in zip(self.buckets, bucket_counts):
+            labels = format_labels(self.label_names, label_values, f"le=\"{format_value(bound)}\"")
+            lines.append(f"{self.name}_bucket{labels} {bucket_count}")
+
+        labels = format_labels(self.label_names, label_values)
+        lines.append(f"{self.name}_sum{labels} {format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+# ---------- METRICS ----------
+
+_registry: list[Metric] = []
+
+scraper_duration = Histogram(
+    "jobspotbot_scraper_duration_seconds", "How long each scraper took to run.", ("scraper",)
+)
+scraper_runs = Counter(
+    "jobspotbot_scraper_runs_total", "Scraper runs, by how they ended.", ("scraper", "outcome")
+)
+scraper_jobs_returned = Gauge(
+    "jobspotbot_scraper_jobs_returned", "Jobs returned by each scraper's last successful run.", ("scraper",)
+)
+scraper_circuit_open = Gauge(
+    "jobspotbot_scraper_circuit_open", "1 if a scraper is skipped after failing repeatedly, else 0.", ("scraper",)
+)
+check_duration = Histogram(
+    "jobspotbot_check_duration_seconds", "How long each check for new jobs took."
+)
+new_jobs_found = Counter(
+    "jobspotbot_new_jobs_total", "New jobs found, before filtering by keywords."
+)
+storage_write_duration = Histogram(
+    "jobspotbot_storage_write_duration_seconds", "How long each write of the storage file took."
+)
+storage_write_bytes = Counter(
+    "jobspotbot_storage_write_bytes_total", "Bytes written to the storage file."
+)
+notification_send_duration = Histogram(
+    "jobspotbot_notification_send_duration_seconds", "How long sending a notification to a channel took."
+)
+notification_failures = Counter(
+    "jobspotbot_notification_failures_total", "Notifications which failed to send."
+)
+notification_outbox_size = Gauge(
+    "jobspotbot_notification_outbox_size", "Jobs waiting in the outbox to be sent to a channel."
+)
+
+# ---------- SERVER ----------
+
+
+def render_metrics() -> str:
+    """Returns every metric in the Prometheus text format."""
+
+    lines = []
+
+    for metric in _registry:
+        lines.extend(metric.render())
+
+    return "\n".join(lines) + "\n"
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+
+        body = render_metrics().encode("utf-8")
+
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes happen every few seconds, don't log them
+        pass
+
+
+def start_metrics_server(port: int):
+    """
+    Serves metrics at http://127.0.0.1:<port>/metrics
+    from a background thread.
+    """
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), MetricsRequestHandler)
+    thread = Thread(target=server.serve_forever, name="metrics", daemon=True)
+    thread.start()
+
+    print(f"Serving metrics at http://127.0.0.1:{port}/metrics")
@@ -0,0 +1,135 @@
+"""
+Notification Outbox | Written by Joshua Sheldon
+
+A persistent queue of new jobs waiting to be sent to
+Discord. New jobs are added to the outbox before they
+become known jobs, so if Discord is down (or the bot
+crashes) they're sent later instead of being lost. An
+entry is only removed once its job was sent to its
+channel, and failed sends are retried with exponential
+backoff.
+"""
+
+# ---------- IMPORTS ----------
+
+# Python Default Imports
+import sqlite3
+from threading import Lock
+import time
+
+# ---------- CONSTANTS ----------
+
+outbox_file_name = "outbox.db"
+
+# Delay before the first retry of a failed send, which
+# doubles with every attempt up to the maximum
+retry_delay_in_s = 30
+max_retry_delay_in_s = 60 * 60
+
+# ---------- CLASSES ----------
+
+
+class OutboxEntry:
+    """A job waiting to be sent to a channel."""
+
+    # Instance Variables
+    channel_id: int
+    job: tuple[str, str]
+    attempts: int
+
+    def __init__(self, channel_id, job, attempts):
+        self.channel_id = channel_id
+        self.job = job
+        self.attempts = attempts
+
+
+class NotificationOutbox:
+    """
+    Keeps the outbox in a SQLite database, with one entry
+    for every job and channel it should be sent to.
+    Enqueuing the same job for the same channel twice is
+    harmless, it's only sent once.
+    """
+
+    _connection: sqlite3.Connection
+    _lock: Lock
+
+    def __init__(self, path: str):
+        # Shared by the check thread and the Discord bot
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = Lock()
+
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS outbox ("
+                "channel_id INTEGER NOT NULL, title TEXT NOT NULL, link TEXT NOT NULL, "
+                "enqueued_at REAL NOT NULL, attempts INTEGER NOT NULL, next_attempt_at REAL NOT NULL, "
+                "PRIMARY KEY (channel_id, title, link)) WITHOUT ROWID"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS outbox_by_next_attempt ON outbox (next_attempt_at)"
+            )
+
+    def enqueue(self, jobs: set[tuple[str, str]], channel_ids: list[int]):
+        """Queues every job to be sent to every channel."""
+
+        now = time.time()
+
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR IGNORE INTO outbox VALUES (?, ?, ?, ?, 0, ?)",
+                ((channel_id, title, link, now, now) for channel_id in channel_ids for title, link in jobs)
+            )
+
+    def get_due(self, limit: int) -> list[OutboxEntry]:
+        """Returns up to limit entries which are due to be sent, oldest first."""
+
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT channel_id, title, link, attempts FROM outbox WHERE next_attempt_at <= ? "
+                "ORDER BY enqueued_at LIMIT ?",
+                (time.time(), limit)
+            ).fetchall()
+
+        return [OutboxEntry(channel_id, (title, link), attempts) for channel_id, title, link, attempts in rows]
+
+    def get_next_attempt_at(self) -> float | None:
+        """Returns when the next entry is due (as a Unix time), if any are queued."""
+
+        with self._lock:
+            return self._connection.execute("SELECT MIN(next_attempt_at) FROM outbox").fetchone()[0]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    def ack(self, entries: list[OutboxEntry]):
+        """Removes entries which were sent (or will never be)."""
+
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "DELETE FROM outbox WHERE channel_id = ? AND title = ? AND link = ?",
+                ((entry.channel_id, entry.job[0], entry.job[1]) for entry in entries)
+            )
+
+    def retry(self, entries: list[OutboxEntry]):
+        """Schedules entries which failed to send to be sent again later."""
+
+        now = time.time()
+
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "UPDATE outbox SET attempts = ?, next_attempt_at = ? "
+                "WHERE channel_id = ? AND title = ? AND link = ?",
+                (
+                    (
+                        entry.attempts + 1,
+                        now + min(retry_delay_in_s * (2 ** entry.attempts), max_retry_delay_in_s),
+                        entry.channel_id,
+                        entry.job[0],
+                        entry.job[1]
+                    )
+                    for entry in entries
+                )
+            )
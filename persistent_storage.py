@@ -2,21 +2,42 @@
 Persistent Storage | Written by Joshua Sheldon
 
 Maintains an object and class that maintain the
-file-based storage that JobSpotBot uses.
+file-based storage that JobSpotBot uses. Keywords
+and known jobs are kept by a pluggable JobStore,
+either inside the storage file or in a separate
+SQLite database (see job_store.py).
 """
 
 # ---------- IMPORTS ----------
 
 # Python Default Imports
+import atexit
 import json
 import os
+from threading import Event, Lock, RLock, Thread
+import time
 
 # Pip Sourced Imports
 import jsonpickle
 
+# Local Imports
+from job_store import (
+    FingerprintJobStore, JobStore, JsonJobStore, PartitionDelta, SqliteJobStore, backend_fingerprint, backend_json,
+    backend_sqlite, legacy_partition
+)
+from keyword_matcher import KeywordMatcher
+import metrics
+from scraper_runner import execution_mode_thread
+
 # ---------- CONSTANTS ----------
 
 file_name = "storage.json"
+database_file_name = "storage.db"
+fingerprints_file_name = "known_jobs.bin"
+
+# How long changes are left to settle before the
+# storage file is written
+flush_delay_in_s = 1.0
 
 # ---------- CLASSES & METHODS ----------
 
@@ -34,9 +55,25 @@ class StorageObject:
     check_interval_in_s: int
     color: str
     keywords: set
-    known_jobs: set
-
-    def __init__(self, bot_token, active_guilds, active_channels, check_interval_in_s, color, keywords, known_jobs):
+    known_jobs: dict[str, set]
+    max_concurrent_scrapers: int
+    scraper_timeout_in_s: int
+    check_deadline_in_s: int
+    storage_backend: str
+    metrics_port: int
+    adaptive_polling: bool
+    min_check_interval_in_s: int
+    max_check_interval_in_s: int
+    scraper_execution_mode: str
+    worker_memory_limit_in_mb: int
+    max_tasks_per_worker: int
+    subscriptions: set
+
+    def __init__(self, bot_token, active_guilds, active_channels, check_interval_in_s, color, keywords, known_jobs,
+                 max_concurrent_scrapers=8, scraper_timeout_in_s=120, check_deadline_in_s=600,
+                 storage_backend=backend_json, metrics_port=0, adaptive_polling=False, min_check_interval_in_s=300,
+                 max_check_interval_in_s=21600, scraper_execution_mode=execution_mode_thread,
+                 worker_memory_limit_in_mb=1024, max_tasks_per_worker=50, subscriptions=None):
         self.bot_token = bot_token
         self.active_guilds = active_guilds
         self.active_channels = active_channels
@@ -44,6 +81,18 @@ class StorageObject:
         self.color = color
         self.keywords = keywords
         self.known_jobs = known_jobs
+        self.max_concurrent_scrapers = max_concurrent_scrapers
+        self.scraper_timeout_in_s = scraper_timeout_in_s
+        self.check_deadline_in_s = check_deadline_in_s
+        self.storage_backend = storage_backend
+        self.metrics_port = metrics_port
+        self.adaptive_polling = adaptive_polling
+        self.min_check_interval_in_s = min_check_interval_in_s
+        self.max_check_interval_in_s = max_check_interval_in_s
+        self.scraper_execution_mode = scraper_execution_mode
+        self.worker_memory_limit_in_mb = worker_memory_limit_in_mb
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self.subscriptions = subscriptions if subscriptions is not None else set()
 
 
 def get_default_storage_object() -> StorageObject:
@@ -60,25 +109,87 @@ def get_default_storage_object() -> StorageObject:
         3600,
         "0xFFFFFF",
         set(),
-        set()
+        dict()
     )
 
 
+def write_atomically(path: str, text: str | bytes):
+    """
+    Writes a file by writing a temporary file next to it,
+    and then renaming it over the original, so a crash can
+    never leave the file half written (or missing).
+    """
+
+    temporary_path = path + ".tmp"
+
+    file = open(temporary_path, "wb" if isinstance(text, bytes) else "w")
+    file.write(text)
+    file.flush()
+    os.fsync(file.fileno())
+    file.close()
+
+    os.replace(temporary_path, path)
+
+    # Make sure the rename itself is on disk
+    if hasattr(os, "O_DIRECTORY"):
+        directory = os.open(os.path.dirname(path) or ".", os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(directory)
+        finally:
+            os.close(directory)
+
+
 class Storage:
     """
     Controller class that creates the storage file if it doesn't
     exist, loads the StorageObject from the storage file if it
     does exist, distributes information from persistent storage,
     accepts modifications to persistent storage, and writes the
-    StorageObject to a file whenever modifications are made.
+    StorageObject to a file in the background shortly after
+    modifications are made.
     """
 
+    _path: str
     _storage: StorageObject
+    _jobs: JobStore
+    _dirty: bool
+    _closed: bool
+    _flusher: Thread | None
+    _flush_requested: Event
+    _write_lock: Lock
+    _snapshot_version: int
+    _written_version: int
+    _jobs_written_version: int
+    _keyword_matcher: KeywordMatcher | None = None
+    _subscription_matcher: KeywordMatcher | None = None
+    _lock: RLock
+
+    def __init__(self, path: str = file_name):
+        """
+        :param path: The storage file. The database and known
+                     jobs files of the other backends are kept
+                     in the same directory.
+        """
+
+        # Storage is shared by the check thread and the
+        # Discord bot, so every modification holds the lock
+        self._lock = RLock()
+        self._path = path
+
+        # The storage file is written in the background
+        # (see mark_dirty())
+        self._dirty = False
+        self._closed = False
+        self._flusher = None
+        self._flush_requested = Event()
+        self._write_lock = Lock()
+        self._snapshot_version = 0
+        self._written_version = 0
+        self._jobs_written_version = 0
 
-    def __init__(self):
         try:
             # Retrieve encoded storage object from file
-            file = open(file_name, "r")
+            file = open(path, "r")
             text = file.read()
             file.close()
 
@@ -86,6 +197,11 @@ class Storage:
             # corresponding instance variable
             self._storage = jsonpickle.decode(text)
 
+            # Storage files created by older versions of the
+            # bot won't have every setting, so fill in defaults
+            if self._add_missing_settings():
+                self.update_storage_file()
+
         except FileNotFoundError:
             print("No storage file, creating default...")
 
@@ -94,6 +210,86 @@ class Storage:
             self.update_storage_file()
             raise Exception("Created new storage file, please set bot token and relaunch!")
 
+        self._jobs = self._open_job_store()
+
+    def _open_job_store(self) -> JobStore:
+        """
+        Creates the JobStore selected in the storage file.
+        When switching to the SQLite backend, any keywords,
+        subscriptions and known jobs still in the storage
+        file are moved into the database. When switching to the fingerprint
+        backend, known jobs are converted to fingerprints.
+        """
+
+        # Storage files from before known jobs were partitioned
+        # hold a single set, which becomes the legacy partition
+        if isinstance(self._storage.known_jobs, set):
+            legacy_jobs = self._storage.known_jobs
+            self._storage.known_jobs = {legacy_partition: legacy_jobs} if len(legacy_jobs) > 0 else dict()
+            self.update_storage_file()
+
+        backend = self._storage.storage_backend
+
+        if backend == backend_sqlite:
+            store = SqliteJobStore(self._get_sibling_path(database_file_name))
+
+            if (len(self._storage.keywords) > 0 or len(self._storage.known_jobs) > 0
+                    or len(self._storage.subscriptions) > 0):
+                print("Migrating keywords, subscriptions and known jobs to the database...")
+
+                # Only empty the storage file once the database
+                # has committed, so nothing is lost in a crash
+                store.import_jobs(self._storage.keywords, self._storage.known_jobs, self._storage.subscriptions)
+                self._storage.keywords = set()
+                self._storage.known_jobs = dict()
+                self._storage.subscriptions = set()
+                self.update_storage_file()
+
+            return store
+
+        if backend == backend_fingerprint:
+            store = FingerprintJobStore(
+                self._get_sibling_path(fingerprints_file_name), self._storage, self.mark_dirty
+            )
+
+            if len(self._storage.known_jobs) > 0:
+                print("Converting known jobs to fingerprints...")
+
+                # Only empty the storage file once the
+                # fingerprints have been saved
+                store.import_jobs(self._storage.known_jobs)
+                write_atomically(*store.take_unsaved_file())
+                self._storage.known_jobs = dict()
+                self.update_storage_file()
+
+            return store
+
+        if backend != backend_json:
+            print(f"Unknown storage backend: \"{backend}\", using \"{backend_json}\"")
+
+        return JsonJobStore(self._storage, self.mark_dirty)
+
+    def _get_sibling_path(self, name: str) -> str:
+        """Returns the path of a file in the same directory as the storage file."""
+        return os.path.join(os.path.dirname(self._path), name)
+
+    def _add_missing_settings(self) -> bool:
+        """
+        Copies the default value of every setting which is
+        missing from the loaded StorageObject.
+
+        :return: True if any settings were added.
+        """
+
+        added = False
+
+        for key, value in vars(get_default_storage_object()).items():
+            if not hasattr(self._storage, key):
+                setattr(self._storage, key, value)
+                added = True
+
+        return added
+
     def add_keyword(self, new_keyword) -> bool:
         """
         Adds the given keyword to the list of keywords.
@@ -103,15 +299,13 @@ class Storage:
                  keywords and therefore was not added.
         """
 
-        lowered_keyword = new_keyword.lower()
-
-        if lowered_keyword in self._storage.keywords:
-            return False
+        with self._lock:
+            was_added = self._jobs.add_keyword(new_keyword.lower())
 
-        self._storage.keywords.add(lowered_keyword)
-        self.update_storage_file()
+            if was_added:
+                self._keyword_matcher = None
 
-        return True
+        return was_added
 
     def del_keyword(self, keyword) -> bool:
         """
@@ -122,13 +316,48 @@ class Storage:
                  the list and therefore was not removed.
         """
 
-        try:
-            self._storage.keywords.remove(keyword.lower())
-            self.update_storage_file()
-            return True
-        except KeyError:
-            # Not a problem.
-            return False
+        with self._lock:
+            was_deleted = self._jobs.del_keyword(keyword.lower())
+
+            if was_deleted:
+                self._keyword_matcher = None
+
+        return was_deleted
+
+    def add_subscription(self, scope: str, scope_id: int, keyword: str) -> bool:
+        """
+        Subscribes a guild or channel to a keyword.
+
+        :return: True if the subscription was added, False if
+                 it already existed.
+        """
+
+        with self._lock:
+            was_added = self._jobs.add_subscription((scope, scope_id, keyword.lower()))
+
+            if was_added:
+                self._subscription_matcher = None
+
+        return was_added
+
+    def del_subscription(self, scope: str, scope_id: int, keyword: str) -> bool:
+        """
+        Unsubscribes a guild or channel from a keyword.
+
+        :return: True if the subscription existed and was
+                 removed, False otherwise.
+        """
+
+        with self._lock:
+            was_deleted = self._jobs.del_subscription((scope, scope_id, keyword.lower()))
+
+            if was_deleted:
+                self._subscription_matcher = None
+
+        return was_deleted
+
+    def is_adaptive_polling_enabled(self) -> bool:
+        return self._storage.adaptive_polling
 
     def get_active_channels(self) -> list[int]:
         return self._storage.active_channels
@@ -139,6 +368,9 @@ class Storage:
     def get_bot_token(self) -> str:
         return self._storage.bot_token
 
+    def get_check_deadline_in_s(self) -> int:
+        return self._storage.check_deadline_in_s
+
     def get_check_interval_in_s(self) -> int:
         return self._storage.check_interval_in_s
 
@@ -157,29 +389,225 @@ class Storage:
             return 0xFFFFFF
 
     def get_keywords(self) -> set:
-        return self._storage.keywords
+        return self._jobs.get_keywords()
+
+    def get_keyword_matcher(self) -> KeywordMatcher:
+        """
+        Returns the keywords compiled into a KeywordMatcher.
+        The matcher is cached, and only rebuilt after the
+        keywords change.
+        """
+
+        with self._lock:
+            if self._keyword_matcher is None:
+                self._keyword_matcher = KeywordMatcher(self.get_keywords())
+
+            return self._keyword_matcher
 
     def get_known_jobs(self) -> set:
-        return self._storage.known_jobs
+        return self._jobs.get_known_jobs()
 
-    def set_known_jobs(self, new_known_jobs: set):
-        self._storage.known_jobs = new_known_jobs
-        self.update_storage_file()
+    def get_known_jobs_partition(self, source: str) -> set:
+        return self._jobs.get_known_jobs_partition(source)
+
+    def count_known_jobs(self) -> int:
+        return self._jobs.count_known_jobs()
+
+    def is_known_job(self, job: tuple[str, str]) -> bool:
+        return self._jobs.is_known_job(job)
+
+    def get_new_jobs(self, open_jobs: set[tuple[str, str]]) -> set[tuple[str, str]]:
+        """Returns every job in open_jobs which isn't known."""
+        return self._jobs.get_new_jobs(open_jobs)
+
+    def get_max_check_interval_in_s(self) -> int:
+        return self._storage.max_check_interval_in_s
+
+    def get_max_concurrent_scrapers(self) -> int:
+        return self._storage.max_concurrent_scrapers
+
+    def get_max_tasks_per_worker(self) -> int:
+        return self._storage.max_tasks_per_worker
+
+    def get_metrics_port(self) -> int:
+        return self._storage.metrics_port
+
+    def get_min_check_interval_in_s(self) -> int:
+        return self._storage.min_check_interval_in_s
+
+    def get_scraper_execution_mode(self) -> str:
+        return self._storage.scraper_execution_mode
+
+    def get_scraper_timeout_in_s(self) -> int:
+        return self._storage.scraper_timeout_in_s
+
+    def get_subscription_matcher(self) -> KeywordMatcher:
+        """
+        Returns the keywords of every subscription compiled
+        into a KeywordMatcher, cached like the keyword matcher.
+        """
+
+        with self._lock:
+            if self._subscription_matcher is None:
+                self._subscription_matcher = KeywordMatcher(
+                    {keyword for _, _, keyword in self.get_subscriptions()}
+                )
+
+            return self._subscription_matcher
+
+    def get_subscriptions(self) -> set[tuple[str, int, str]]:
+        """Returns every subscription as (scope, scope ID, keyword)."""
+        return self._jobs.get_subscriptions()
+
+    def get_worker_memory_limit_in_mb(self) -> int:
+        return self._storage.worker_memory_limit_in_mb
+
+    def replace_known_jobs_partition(self, source: str, jobs: set[tuple[str, str]]) -> PartitionDelta:
+        """
+        Replaces the known jobs found by one scraper, and
+        returns how that scraper's known jobs changed.
+        """
+        with self._lock:
+            return self._jobs.replace_known_jobs_partition(source, jobs)
+
+    def add_to_known_jobs_partition(self, source: str, jobs: set[tuple[str, str]]) -> PartitionDelta:
+        """
+        Adds to the known jobs found by one scraper, without
+        forgetting any, and returns how they changed.
+        """
+        with self._lock:
+            return self._jobs.add_to_known_jobs_partition(source, jobs)
+
+    def mark_dirty(self):
+        """
+        Schedules the storage file to be written in the
+        background. Changes made in quick succession are
+        written together, once they've settled.
+        """
+
+        with self._lock:
+            self._dirty = True
+            closed = self._closed
+
+            if self._flusher is None and not closed:
+                self._flusher = Thread(target=self._run_flusher, name="storage-flusher", daemon=True)
+                self._flusher.start()
+
+                # Don't lose changes if the bot exits without
+                # closing storage
+                atexit.register(self.close)
+
+        # Once closed, changes are written right away
+        if closed:
+            self.flush()
+        else:
+            self._flush_requested.set()
+
+    def _run_flusher(self):
+        while True:
+            self._flush_requested.wait()
+            self._flush_requested.clear()
+
+            if self._closed:
+                return
+
+            # Let a burst of changes finish
+            time.sleep(flush_delay_in_s)
+
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Failed to write storage file, retrying: {e}")
+                self.mark_dirty()
+
+    def flush(self):
+        """
+        Writes the storage file now, if it has unwritten
+        changes. Any file the job store holds back (see
+        JobStore.take_unsaved_file()) is written first.
+        """
+
+        with self._lock:
+            if not self._dirty:
+                return
+
+            write_start = time.monotonic()
+
+            # Convert instance variable to JSON
+            unformatted_json = jsonpickle.encode(self._storage)
+
+            # Migrations write before the job store is open
+            unsaved_file = self._jobs.take_unsaved_file() if hasattr(self, "_jobs") else None
+            self._dirty = False
+            self._snapshot_version += 1
+            version = self._snapshot_version
 
-    def update_storage_file(self):
-        # Convert instance variable to JSON
-        unformatted_json = jsonpickle.encode(self._storage)
         json_object = json.loads(unformatted_json)
         formatted_json_string = json.dumps(json_object, indent=2)
+        jobs_written = False
 
-        # Delete the existing file
         try:
-            os.remove(file_name)
+            with self._write_lock:
+                # Never replace a newer snapshot with an older
+                # one. A newer snapshot may not have included the
+                # job store's file, so it's checked separately.
+                if unsaved_file is not None and version > self._jobs_written_version:
+                    write_atomically(*unsaved_file)
+                    self._jobs_written_version = version
+
+                jobs_written = True
+
+                if version < self._written_version:
+                    return
+
+                write_atomically(self._path, formatted_json_string)
+                self._written_version = version
         except Exception:
-            # Really doesn't matter if this works or not
-            pass
+            with self._lock:
+                self._dirty = True
+
+                if unsaved_file is not None and not jobs_written:
+                    self._jobs.mark_unsaved()
+            raise
+
+        metrics.storage_write_duration.observe(time.monotonic() - write_start)
+        metrics.storage_write_bytes.inc(len(formatted_json_string.encode("utf-8")))
+
+    def update_storage_file(self):
+        """Writes the storage file now, and waits for it to be written."""
+
+        with self._lock:
+            self._dirty = True
+
+        self.flush()
+
+    def close(self):
+        """
+        Stops the background writer, and writes any changes
+        which haven't been written yet. Called on shutdown.
+        """
+
+        with self._lock:
+            if self._closed:
+                return
+
+            self._closed = True
+            flusher = self._flusher
+
+        if flusher is not None:
+            atexit.unregister(self.close)
+            self._flush_requested.set()
+            flusher.join()
+
+        self.flush()
+
+    def release(self):
+        """
+        Closes storage (see close()), and then the job store,
+        so its database connection isn't left open. Storage
+        can't be used afterwards, so only call this once
+        nothing else could still be using it.
+        """
 
-        # Write new storage object
-        file = open(file_name, "x")
-        file.write(formatted_json_string)
-        file.close()
+        self.close()
+        self._jobs.close()
@@ -0,0 +1,274 @@
+"""
+Polite HTTP | Written by Joshua Sheldon
+
+A shared HTTP client for scrapers, which keeps every
+scraper polite towards the hosts it fetches from, even
+when many scrapers fetch from the same host at once
+(ex. many companies on one applicant tracking system).
+
+Requests to each host are limited by a token bucket,
+so bursts are allowed but the average rate stays under
+a limit, and by a cap on how many requests to the host
+can be in flight at once. Connections are pooled and
+kept alive in a single shared session. When a host
+answers 429 Too Many Requests or 503 Service
+Unavailable, every request to that host waits for as
+long as its Retry-After header asks before retrying.
+"""
+
+# ---------- IMPORTS ----------
+
+# Python Default Imports
+from email.utils import parsedate_to_datetime
+from threading import BoundedSemaphore, Lock
+import time
+from urllib.parse import urlsplit
+
+# Pip Sourced Imports
+import requests
+
+# Local Imports
+from http_replay import get_adapter_from_environment, is_replaying
+
+# ---------- CONSTANTS ----------
+
+# Average requests per second sent to any one host, and
+# how many requests can be sent at once before that
+# average applies
+requests_per_s_per_host = 5.0
+burst_per_host = 10
+
+# Most requests in flight to any one host at once
+max_connections_per_host = 4
+
+# Most hosts connections are kept alive for
+max_pooled_hosts = 64
+
+request_timeout_in_s = 30
+
+# Responses which ask us to slow down and retry later
+retry_status_codes = (429, 503)
+max_retries = 3
+
+# How long to wait before retrying when a host doesn't
+# say, which doubles with every retry
+default_retry_delay_in_s = 1.0
+
+# Longest Retry-After we'll wait for. Scrapers are
+# abandoned once they time out, so there's no point
+# waiting for longer; the response is returned instead.
+max_retry_after_in_s = 60.0
+
+# ---------- CLASSES & METHODS ----------
+
+
+def get_host(url: str) -> str:
+    return urlsplit(url).netloc.lower()
+
+
+def get_retry_after_in_s(response: requests.Response) -> float | None:
+    """
+    Returns how long the Retry-After header of a response
+    asks us to wait, which is either a number of seconds
+    or an HTTP date. None if there's no valid header.
+    """
+
+    value = response.headers.get("Retry-After")
+    if value is None:
+        return None
+
+    value = value.strip()
+
+    if value.isdigit():
+        return float(value)
+
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class HostLimiter:
+    """
+    The token bucket and connection cap of a single host.
+    Requests reserve a token ahead of time, and wait until
+    the bucket would have refilled enough to hold it, so
+    waiting requests are let through in order.
+    """
+
+    _tokens: float
+    _updated_at: float
+    _blocked_until: float
+    _lock: Lock
+    connections: BoundedSemaphore
+
+    def __init__(self):
+        self._tokens = burst_per_host
+        self._updated_at = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = Lock()
+        self.connections = BoundedSemaphore(max_connections_per_host)
+
+    def reserve(self) -> float:
+        """
+        Takes a token from the bucket.
+
+        :return: How long to wait before sending the request.
+        """
+
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(burst_per_host, self._tokens + (now - self._updated_at) * requests_per_s_per_host)
+            self._updated_at = now
+            self._tokens -= 1
+
+            delay = max(-self._tokens / requests_per_s_per_host, 0.0)
+            return max(delay, self._blocked_until - now)
+
+    def block(self, duration_in_s: float):
+        """Holds back every request to the host for a while."""
+
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + duration_in_s)
+
+
+def release_when_closed(response: requests.Response, semaphore: BoundedSemaphore):
+    """Releases the semaphore once the response is closed (only the first time)."""
+
+    close = response.close
+    released = False
+
+    def close_and_release():
+        nonlocal released
+
+        try:
+            close()
+        finally:
+            if not released:
+                released = True
+                semaphore.release()
+
+    response.close = close_and_release
+
+
+class PoliteSession:
+    """
+    Sends requests over a shared, pooled requests session,
+    limited per host (see HostLimiter).
+    """
+
+    _session: requests.Session
+    _limiters: dict[str, HostLimiter]
+    _lock: Lock
+    _limited: bool
+
+    def __init__(self):
+        self._limiters = dict()
+        self._lock = Lock()
+
+        # Replayed responses (see http_replay.py) don't
+        # come from a host, so there's nothing to limit
+        self._limited = not is_replaying()
+
+        # Enough connections for every request the host
+        # limiters let through at once
+        self._session = requests.Session()
+        adapter = get_adapter_from_environment(
+            pool_connections=max_pooled_hosts, pool_maxsize=max_connections_per_host
+        )
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+    def _get_limiter(self, host: str) -> HostLimiter:
+        with self._lock:
+            limiter = self._limiters.get(host)
+
+            if limiter is None:
+                limiter = HostLimiter()
+                self._limiters[host] = limiter
+
+            return limiter
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """
+        Sends a request once the host's limits allow it, and
+        retries it if the host asks us to slow down. Takes
+        the same arguments as requests.request(). Streamed
+        responses (stream=True) hold one of the host's
+        connections until they're closed, so always close them.
+        """
+
+        kwargs.setdefault("timeout", request_timeout_in_s)
+
+        if not self._limited:
+            return self._session.request(method, url, **kwargs)
+
+        host = get_host(url)
+        limiter = self._get_limiter(host)
+
+        attempt = 0
+
+        while True:
+            # Wait for a token before taking a connection, so
+            # waiting never holds up the host's other requests
+            delay = limiter.reserve()
+            if delay > 0:
+                time.sleep(delay)
+
+            limiter.connections.acquire()
+            try:
+                response = self._session.request(method, url, **kwargs)
+            except BaseException:
+                limiter.connections.release()
+                raise
+
+            if kwargs.get("stream", False):
+                # The body is read after this returns, so the
+                # connection is in use until the response closes
+                release_when_closed(response, limiter.connections)
+            else:
+                limiter.connections.release()
+
+            if response.status_code not in retry_status_codes:
+                return response
+
+            retry_after = get_retry_after_in_s(response)
+            if retry_after is None:
+                retry_after = default_retry_delay_in_s * (2 ** attempt)
+
+            # Other scrapers shouldn't hit the host meanwhile
+            limiter.block(min(retry_after, max_retry_after_in_s))
+
+            if attempt >= max_retries or retry_after > max_retry_after_in_s:
+                return response
+
+            print(f"{host} answered {response.status_code}, retrying in {retry_after:.0f}s")
+            response.close()
+            attempt += 1
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+
+_session: PoliteSession | None = None
+_session_lock = Lock()
+
+
+def get_polite_session() -> PoliteSession:
+    """Returns the shared PoliteSession, creating it the first time it's needed."""
+
+    global _session
+
+    with _session_lock:
+        if _session is None:
+            _session = PoliteSession()
+
+        return _session
+
+
+def polite_get(url: str, **kwargs) -> requests.Response:
+    """
+    Sends a GET request through the shared PoliteSession.
+    Takes the same arguments as requests.get().
+    """
+    return get_polite_session().get(url, **kwargs)
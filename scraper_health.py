@@ -0,0 +1,184 @@
+"""
+Scraper Health | Written by Joshua Sheldon
+
+Tracks the health of every scraper: how many times in
+a row it has failed, how long it usually takes, and
+when it last succeeded. Each scraper has a circuit
+breaker. Once a scraper fails (or times out) several
+times in a row its circuit opens, and it's skipped by
+checks instead of failing again every time. Once the
+circuit has been open for a while, the scraper is run
+once more as a probe. If the probe succeeds the circuit
+closes, otherwise it stays open for twice as long.
+
+Skipped scrapers keep their known jobs, exactly like
+scrapers which failed, so their jobs aren't reported
+as new again once their job board is back.
+"""
+
+# ---------- IMPORTS ----------
+
+# Python Default Imports
+from threading import Lock
+import time
+
+# Local Imports
+from scraper_runner import ScraperResult, outcome_error, outcome_ok, outcome_timeout
+
+# ---------- CONSTANTS ----------
+
+state_closed = "closed"
+state_open = "open"
+state_half_open = "half-open"
+
+# Consecutive failures which open a scraper's circuit
+failure_threshold = 3
+
+# How long a circuit first stays open, which doubles
+# every time a probe fails, up to the maximum
+open_duration_in_s = 5 * 60
+max_open_duration_in_s = 6 * 60 * 60
+
+# How much weight each new duration gets in the
+# average duration of a scraper
+latency_smoothing_factor = 0.2
+
+# ---------- CLASSES & METHODS ----------
+
+
+class ScraperHealth:
+    """The health of a single scraper."""
+
+    # Instance Variables
+    name: str
+    state: str
+    consecutive_failures: int
+    latency_ewma_in_s: float | None
+    last_success_at: float | None
+    last_error: str | None
+    open_until: float
+    num_failed_probes: int
+
+    def __init__(self, name):
+        self.name = name
+        self.state = state_closed
+        self.consecutive_failures = 0
+        self.latency_ewma_in_s = None
+        self.last_success_at = None
+        self.last_error = None
+        self.open_until = 0.0
+        self.num_failed_probes = 0
+
+    def copy(self) -> "ScraperHealth":
+        health = ScraperHealth(self.name)
+        health.__dict__.update(self.__dict__)
+        return health
+
+
+class HealthTracker:
+    """
+    Keeps the health of every scraper, and decides which
+    scrapers a check should run. Times are Unix times, so
+    they can be shown in Discord.
+    """
+
+    _health: dict[str, ScraperHealth]
+    _lock: Lock
+
+    def __init__(self):
+        self._health = dict()
+        self._lock = Lock()
+
+    def should_run(self, name: str, now: float | None = None) -> bool:
+        """
+        Returns False if the scraper's circuit is open. A
+        scraper whose circuit has been open long enough is
+        allowed a single probe, and is half-open until the
+        probe's result is recorded.
+        """
+
+        if now is None:
+            now = time.time()
+
+        with self._lock:
+            health = self._health.get(name)
+
+            if health is None or health.state == state_closed:
+                return True
+
+            if health.state == state_open and now >= health.open_until:
+                health.state = state_half_open
+                print(f"Probing scraper {name} after {health.consecutive_failures} failure(s) in a row.")
+
+            return health.state == state_half_open
+
+    def record(self, result: ScraperResult, now: float | None = None):
+        """
+        Updates the health of the scraper the result is from.
+        Scrapers cut off by the check deadline weren't
+        necessarily at fault, so those results are ignored.
+        """
+
+        if result.outcome not in (outcome_ok, outcome_error, outcome_timeout):
+            return
+
+        if now is None:
+            now = time.time()
+
+        with self._lock:
+            health = self._health.get(result.name)
+            if health is None:
+                health = ScraperHealth(result.name)
+                self._health[result.name] = health
+
+            if health.latency_ewma_in_s is None:
+                health.latency_ewma_in_s = result.duration_in_s
+            else:
+                health.latency_ewma_in_s = (latency_smoothing_factor * result.duration_in_s
+                                            + (1 - latency_smoothing_factor) * health.latency_ewma_in_s)
+
+            if result.is_ok():
+                if health.state != state_closed:
+                    print(f"Scraper {result.name} recovered, closing its circuit.")
+
+                health.state = state_closed
+                health.consecutive_failures = 0
+                health.num_failed_probes = 0
+                health.last_success_at = now
+                return
+
+            health.consecutive_failures += 1
+            health.last_error = "timed out" if result.outcome == outcome_timeout else str(result.error)
+
+            if health.state == state_half_open:
+                health.num_failed_probes += 1
+            elif health.consecutive_failures < failure_threshold:
+                return
+
+            duration = min(open_duration_in_s * (2 ** health.num_failed_probes), max_open_duration_in_s)
+            health.state = state_open
+            health.open_until = now + duration
+            print(f"Scraper {result.name} failed {health.consecutive_failures} time(s) in a row, skipping it "
+                  f"for {duration}s.")
+
+    def get_health(self) -> list[ScraperHealth]:
+        """Returns a copy of the health of every scraper which has run."""
+
+        with self._lock:
+            return [health.copy() for health in self._health.values()]
+
+
+_tracker: HealthTracker | None = None
+_tracker_lock = Lock()
+
+
+def get_health_tracker() -> HealthTracker:
+    """Returns the shared HealthTracker, creating it the first time it's needed."""
+
+    global _tracker
+
+    with _tracker_lock:
+        if _tracker is None:
+            _tracker = HealthTracker()
+
+        return _tracker
@@ -0,0 +1,176 @@
+"""
+Scraper Loader | Written by Joshua Sheldon
+
+Finds the scrapers in the "scrapers/" directory and
+keeps them loaded. Scrapers are discovered from the
+files in the directory alone, then imported in
+parallel in the background, so the bot doesn't wait
+for every scraper (and its dependencies) to be
+imported before connecting to Discord. The directory
+is then watched, and scrapers which are added,
+changed, or deleted are loaded, reloaded, or removed
+without restarting the bot.
+"""
+
+# ---------- IMPORTS ----------
+
+# Python Default Imports
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import importlib
+import os
+from pathlib import Path
+import sys
+
+# Local Imports
+from abstract_scraper import AbstractScraper, AsyncAbstractScraper
+
+# ---------- CONSTANTS ----------
+
+scrapers_dir_name = "scrapers"
+scraper_class_name = "Scraper"
+
+# Most scrapers imported at the same time
+max_loader_threads = 8
+
+# How often the scrapers directory is checked for changes
+reload_interval_in_s = 5
+
+# ---------- CLASSES & METHODS ----------
+
+
+def get_module_mtime(module_name: str) -> int | None:
+    """
+    Returns when the file of an imported module was last
+    modified, or None if it isn't imported (or is gone).
+    """
+
+    module = sys.modules.get(module_name)
+    if module is None or getattr(module, "__file__", None) is None:
+        return None
+
+    try:
+        return os.stat(module.__file__).st_mtime_ns
+    except OSError:
+        return None
+
+
+class ScraperLoader:
+    """
+    Keeps a live set of scrapers in sync with the scrapers
+    directory. Everything else (the scheduler, the Discord
+    interface) holds the same set, and copies it before
+    using it, so scrapers can be swapped in and out while
+    checks run.
+    """
+
+    scrapers: set[AbstractScraper]
+    _path: Path
+    _loaded: dict[str, tuple[int, AbstractScraper]]
+    _failed: dict[str, int]
+
+    def __init__(self, path: Path):
+        self.scrapers = set()
+        self._path = path
+
+        # Module name to the modification time of the
+        # file it was loaded from, and its scraper
+        self._loaded = dict()
+
+        # Files which failed to load aren't tried again
+        # until they change
+        self._failed = dict()
+
+    def discover(self) -> dict[str, int]:
+        """
+        Returns the name of every scraper in the directory, and
+        when its file was last modified, without importing it.
+        """
+
+        modules = dict()
+
+        for file in self._path.glob("*.py"):
+            try:
+                modules[file.stem] = file.stat().st_mtime_ns
+            except OSError:
+                # Deleted while we were looking
+                pass
+
+        return modules
+
+    @staticmethod
+    def _load(module_name: str) -> AbstractScraper:
+        """Imports (or reimports) a scraper module and creates its scraper."""
+
+        full_name = f"{scrapers_dir_name}.{module_name}"
+        module = sys.modules.get(full_name)
+
+        if module is None:
+            module = importlib.import_module(full_name)
+        else:
+            module = importlib.reload(module)
+
+        return getattr(module, scraper_class_name)()
+
+    def sync(self):
+        """
+        Loads scrapers which are new or changed, and removes
+        scrapers whose files are gone. Imports run in
+        parallel. A scraper which fails to reload keeps
+        running as it was.
+        """
+
+        modules = self.discover()
+
+        to_load = [
+            module_name for module_name, mtime in modules.items()
+            if self._loaded.get(module_name, (None,))[0] != mtime and self._failed.get(module_name) != mtime
+        ]
+
+        if len(to_load) > 0:
+            # New files aren't seen by the import system otherwise
+            importlib.invalidate_caches()
+
+            with ThreadPoolExecutor(max_workers=max_loader_threads, thread_name_prefix="scraper-loader") as executor:
+                futures = {module_name: executor.submit(self._load, module_name) for module_name in to_load}
+
+            for module_name, future in futures.items():
+                previous = self._loaded.get(module_name)
+
+                try:
+                    scraper = future.result()
+                except Exception as e:
+                    print(f"Failed to load scraper {module_name}:", e)
+                    self._failed[module_name] = modules[module_name]
+                    continue
+
+                if previous is not None:
+                    self.scrapers.discard(previous[1])
+                    print(f"Reloaded scraper {module_name}.")
+                elif isinstance(scraper, AsyncAbstractScraper):
+                    print(f"Loaded async scraper {module_name}.")
+
+                self.scrapers.add(scraper)
+                self._loaded[module_name] = (modules[module_name], scraper)
+                self._failed.pop(module_name, None)
+
+        for module_name in list(self._loaded):
+            if module_name not in modules:
+                self.scrapers.discard(self._loaded.pop(module_name)[1])
+                sys.modules.pop(f"{scrapers_dir_name}.{module_name}", None)
+                print(f"Removed scraper {module_name}.")
+
+        for module_name in list(self._failed):
+            if module_name not in modules:
+                del self._failed[module_name]
+
+    async def watch(self):
+        """Keeps the scrapers in sync with the directory forever. Start it as a task."""
+
+        while True:
+            await asyncio.sleep(reload_interval_in_s)
+
+            try:
+                await asyncio.to_thread(self.sync)
+            except Exception as e:
+                print(f"Failed to reload scrapers: {e}")
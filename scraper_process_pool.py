@@ -0,0 +1,332 @@
+"""
+Scraper Process Pool | Written by Joshua Sheldon
+
+Runs scrapers in a pool of worker processes instead of
+the bot's own process. Parsing in a worker doesn't hold
+the bot's GIL, so heavy scrapers scale across cores and
+the Discord client stays responsive. A worker which runs
+for too long is killed, a worker which allocates too
+much memory fails its scraper instead of the bot, and
+every worker is replaced after a number of tasks, so
+leaks don't build up. Only the (title, link) pairs of
+each job are sent back to the bot.
+"""
+
+# ---------- IMPORTS ----------
+
+# Python Default Imports
+import atexit
+from concurrent.futures import Future
+import importlib
+import multiprocessing
+from multiprocessing.connection import Connection
+import queue
+from threading import Lock, Thread
+import time
+from typing import Callable
+
+# Local Imports
+from abstract_scraper import AbstractScraper, StreamingAbstractScraper
+from scraper_loader import get_module_mtime
+
+# ---------- CONSTANTS ----------
+
+# Longest time a worker's manager waits on the worker
+# before checking whether the pool is shutting down
+poll_interval_in_s = 1.0
+
+# How long a worker gets to exit cleanly before it's killed
+shutdown_timeout_in_s = 5
+
+# Workers are started fresh, rather than forked from a
+# bot which has threads and open connections
+start_method = "spawn"
+
+# ---------- WORKER ----------
+
+
+def limit_memory(memory_limit_in_mb: int):
+    """
+    Limits the address space of the current process. Not
+    every platform supports this, in which case workers
+    run without a memory limit.
+    """
+
+    if memory_limit_in_mb <= 0:
+        return
+
+    try:
+        import resource
+
+        limit = memory_limit_in_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ImportError, ValueError, OSError) as e:
+        print(f"Failed to limit scraper worker memory: {e}")
+
+
+def run_worker(connection: Connection, memory_limit_in_mb: int):
+    """
+    The main loop of a worker process. Receives the module
+    and class name of a scraper (and the known jobs it may
+    stop at), runs it, and sends back ("ok", jobs, complete)
+    or ("error", message). Scrapers are only created once
+    per worker, unless their file changed since (see
+    scraper_loader.py). Stops when it receives None.
+    """
+
+    limit_memory(memory_limit_in_mb)
+    scrapers: dict[tuple[str, str], tuple[AbstractScraper, int | None]] = {}
+
+    while True:
+        task = connection.recv()
+        if task is None:
+            return
+
+        module_name, class_name, known_jobs = task
+        key = (module_name, class_name)
+
+        try:
+            scraper, mtime = scrapers.get(key, (None, None))
+
+            if scraper is None or get_module_mtime(module_name) != mtime:
+                module = importlib.import_module(module_name)
+
+                # The scraper was changed since we created it
+                if scraper is not None:
+                    module = importlib.reload(module)
+
+                scraper = getattr(module, class_name)()
+                scrapers[key] = (scraper, get_module_mtime(module_name))
+
+            if isinstance(scraper, StreamingAbstractScraper):
+                jobs, complete = scraper.scrape_until_known(known_jobs)
+            else:
+                jobs, complete = scraper.scrape_open_jobs(), True
+
+            response = ("ok", [(str(title), str(link)) for title, link in jobs], complete)
+        except MemoryError:
+            # Free whatever the scraper was holding on to
+            scrapers.pop(key, None)
+            response = ("error", "scraper ran out of memory")
+        except Exception as e:
+            # Arbitrary code execution, anything can go wrong
+            response = ("error", f"{type(e).__name__}: {e}")
+
+        connection.send(response)
+
+# ---------- CLASSES & METHODS ----------
+
+
+class ScraperWorkerError(Exception):
+    """Raised for scrapers which failed inside a worker process."""
+
+
+class ScraperWorkerTimeout(ScraperWorkerError):
+    """Raised for scrapers whose worker was killed for running too long."""
+
+
+class ScraperProcessPool:
+    """
+    A fixed number of worker processes, each managed by a
+    thread in the bot which hands it tasks and enforces
+    its limits. Scrapers must be importable by their
+    module name (all scrapers in "scrapers/" are).
+    """
+
+    _num_workers: int
+    _timeout_in_s: float
+    _memory_limit_in_mb: int
+    _max_tasks_per_worker: int
+    _context: multiprocessing.context.BaseContext
+    _tasks: queue.Queue
+    _threads: list[Thread]
+    _closed: bool
+
+    def __init__(self, num_workers: int, timeout_in_s: float, memory_limit_in_mb: int, max_tasks_per_worker: int):
+        """
+        :param num_workers: How many scrapers can run at once.
+        :param timeout_in_s: How long a scraper may run before
+                             its worker is killed.
+        :param memory_limit_in_mb: The address space limit of
+                                   every worker, 0 for none.
+        :param max_tasks_per_worker: How many scrapers a worker
+                                     runs before it's replaced.
+        """
+        self._num_workers = max(1, num_workers)
+        self._timeout_in_s = timeout_in_s
+        self._memory_limit_in_mb = memory_limit_in_mb
+        self._max_tasks_per_worker = max(1, max_tasks_per_worker)
+        self._context = multiprocessing.get_context(start_method)
+        self._tasks = queue.Queue()
+        self._closed = False
+
+        self._threads = []
+        for i in range(self._num_workers):
+            thread = Thread(target=self._manage_worker, name=f"scraper-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(
+            self,
+            scraper: AbstractScraper,
+            on_start: Callable[[], None] | None = None,
+            known_jobs: set[tuple[str, str]] | None = None
+    ) -> Future:
+        """
+        Queues the scraper to run in the next free worker.
+
+        :param on_start: Called right before the scraper is
+                         handed to a worker.
+        :param known_jobs: The known jobs a streaming scraper
+                           stops at, None to scrape every page.
+        :return: A future which resolves to the set of open
+                 jobs and whether it's complete, or raises
+                 ScraperWorkerError.
+        """
+
+        future = Future()
+        self._tasks.put((scraper, on_start, known_jobs, future))
+        return future
+
+    def _start_worker(self) -> tuple[multiprocessing.process.BaseProcess, Connection]:
+        connection, worker_connection = self._context.Pipe()
+        process = self._context.Process(
+            target=run_worker,
+            args=(worker_connection, self._memory_limit_in_mb),
+            daemon=True
+        )
+        process.start()
+        worker_connection.close()
+        return process, connection
+
+    def _stop_worker(self, process: multiprocessing.process.BaseProcess, connection: Connection, kill: bool):
+        if not kill:
+            try:
+                connection.send(None)
+                process.join(shutdown_timeout_in_s)
+            except (OSError, ValueError):
+                pass
+
+        if process.is_alive():
+            process.kill()
+            process.join()
+
+        connection.close()
+
+    def _run_task(self, connection: Connection, scraper: AbstractScraper, known_jobs: set | None) -> tuple:
+        """
+        Runs the scraper in the worker on the other end of the
+        connection, and returns its response. The response is
+        ("timeout",) if the worker ran for too long, or
+        ("crash",) if it died.
+        """
+
+        scraper_class = type(scraper)
+        connection.send((scraper_class.__module__, scraper_class.__qualname__, known_jobs))
+        task_deadline = time.monotonic() + self._timeout_in_s
+
+        while True:
+            remaining = task_deadline - time.monotonic()
+            if remaining <= 0 or self._closed:
+                return ("timeout",)
+
+            try:
+                if connection.poll(min(remaining, poll_interval_in_s)):
+                    return connection.recv()
+            except (EOFError, OSError):
+                return ("crash",)
+
+    def _manage_worker(self):
+        process = None
+        connection = None
+        num_tasks = 0
+
+        while not self._closed:
+            try:
+                task = self._tasks.get(timeout=poll_interval_in_s)
+            except queue.Empty:
+                continue
+
+            if task is None:
+                break
+
+            scraper, on_start, known_jobs, future = task
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            if process is None:
+                process, connection = self._start_worker()
+                num_tasks = 0
+
+            if on_start is not None:
+                on_start()
+
+            response = self._run_task(connection, scraper, known_jobs)
+            status = response[0]
+            num_tasks += 1
+
+            if status == "ok":
+                future.set_result((set(response[1]), response[2]))
+            elif status == "error":
+                future.set_exception(ScraperWorkerError(response[1]))
+            elif status == "timeout":
+                future.set_exception(ScraperWorkerTimeout(f"worker killed after {self._timeout_in_s}s"))
+            else:
+                process.join(shutdown_timeout_in_s)
+                future.set_exception(ScraperWorkerError(f"worker died with exit code {process.exitcode}"))
+
+            # Replace workers which were killed, died, or
+            # have run enough scrapers
+            if status in ("timeout", "crash") or num_tasks >= self._max_tasks_per_worker:
+                self._stop_worker(process, connection, kill=status in ("timeout", "crash"))
+                process = None
+                connection = None
+
+        if process is not None:
+            self._stop_worker(process, connection, kill=False)
+
+    def close(self):
+        """Stops every worker, and fails scrapers still queued."""
+
+        self._closed = True
+
+        for _ in self._threads:
+            self._tasks.put(None)
+
+        for thread in self._threads:
+            thread.join(shutdown_timeout_in_s + poll_interval_in_s)
+
+        while True:
+            try:
+                task = self._tasks.get_nowait()
+            except queue.Empty:
+                break
+
+            if task is not None and task[3].set_running_or_notify_cancel():
+                task[3].set_exception(ScraperWorkerError("scraper process pool closed"))
+
+
+_pool: ScraperProcessPool | None = None
+_pool_lock = Lock()
+
+
+def get_scraper_process_pool(
+        num_workers: int,
+        timeout_in_s: float,
+        memory_limit_in_mb: int,
+        max_tasks_per_worker: int
+) -> ScraperProcessPool:
+    """
+    Returns the shared ScraperProcessPool, starting it the
+    first time it's needed. Settings only take effect
+    when the pool is started.
+    """
+
+    global _pool
+
+    with _pool_lock:
+        if _pool is None:
+            _pool = ScraperProcessPool(num_workers, timeout_in_s, memory_limit_in_mb, max_tasks_per_worker)
+            atexit.register(_pool.close)
+
+        return _pool
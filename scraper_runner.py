@@ -0,0 +1,304 @@
+"""
+Scraper Runner | Written by Joshua Sheldon
+
+Runs a set of scrapers concurrently. Regular scrapers
+run on a bounded pool of worker threads (or worker
+processes, see scraper_process_pool.py), and async
+scrapers run on the shared async scraper event loop.
+Every scraper gets its own timeout, and the run as
+a whole is bounded by a cycle deadline. The duration
+and outcome of each scraper is reported back to the
+caller.
+"""
+
+# ---------- IMPORTS ----------
+
+# Python Default Imports
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+from queue import Empty, SimpleQueue
+from threading import Thread
+import time
+from typing import Callable
+
+# Local Imports
+from abstract_scraper import AbstractScraper, AsyncAbstractScraper, StreamingAbstractScraper
+from async_scraper_host import get_async_scraper_host
+from check_profiler import get_check_profiler
+from scraper_process_pool import ScraperProcessPool, ScraperWorkerTimeout
+
+# ---------- CONSTANTS ----------
+
+# Longest time the runner sleeps before re-checking
+# scrapers for expired timeouts
+poll_interval_in_s = 1.0
+
+outcome_ok = "ok"
+outcome_error = "error"
+outcome_timeout = "timeout"
+outcome_deadline = "deadline"
+outcome_skipped = "skipped"
+
+execution_mode_thread = "thread"
+execution_mode_process = "process"
+
+# ---------- CLASSES & METHODS ----------
+
+
+class ScraperResult:
+    """
+    The result of running a single scraper: its name,
+    how the run ended, how long it took, and the jobs
+    it returned (empty unless the outcome is "ok"). How
+    many of those jobs were new is filled in once the
+    jobs have been compared with the known jobs.
+
+    A streaming scraper which was stopped early only
+    returns some of its open jobs, so its result isn't
+    complete.
+    """
+
+    # Instance Variables
+    name: str
+    outcome: str
+    jobs: set[tuple[str, str]]
+    duration_in_s: float
+    error: Exception | None
+    num_new_jobs: int
+    complete: bool
+
+    def __init__(self, name, outcome, jobs, duration_in_s, error=None, complete=True):
+        self.name = name
+        self.outcome = outcome
+        self.jobs = jobs
+        self.duration_in_s = duration_in_s
+        self.error = error
+        self.num_new_jobs = 0
+        self.complete = complete
+
+    def is_ok(self) -> bool:
+        return self.outcome == outcome_ok
+
+
+class DaemonThreadPool:
+    """
+    A minimal thread pool whose workers are daemon threads.
+    ThreadPoolExecutor joins its workers when the interpreter
+    exits, so a single scraper which never returns would stop
+    the bot from ever shutting down. Daemon threads are
+    simply dropped instead.
+    """
+
+    _max_workers: int
+    _thread_name_prefix: str
+    _queue: SimpleQueue
+    _threads: list[Thread]
+
+    def __init__(self, max_workers: int, thread_name_prefix: str):
+        self._max_workers = max_workers
+        self._thread_name_prefix = thread_name_prefix
+        self._queue = SimpleQueue()
+        self._threads = []
+
+    def submit(self, function: Callable, *args) -> Future:
+        future = Future()
+        self._queue.put((future, function, args))
+
+        if len(self._threads) < self._max_workers:
+            thread = Thread(
+                target=self._work, name=f"{self._thread_name_prefix}_{len(self._threads)}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+        return future
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+
+            if item is None:
+                return
+
+            future, function, args = item
+
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            try:
+                result = function(*args)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+    def shutdown(self):
+        """
+        Cancels work which hasn't started, and stops each
+        worker once it's done with its current work.
+        Doesn't wait for them.
+        """
+
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except Empty:
+                break
+
+            if item is not None:
+                item[0].cancel()
+
+        for _ in self._threads:
+            self._queue.put(None)
+
+
+def get_scraper_name(scraper: AbstractScraper) -> str:
+    """
+    Returns the name of the module the scraper was
+    loaded from (ex. "example_scraper"), which is
+    what we use to identify scrapers in logs.
+    """
+    return type(scraper).__module__.rsplit(".", 1)[-1]
+
+
+def log_result(result: ScraperResult):
+    if result.is_ok() and not result.complete:
+        print(f"Scraper {result.name} found {len(result.jobs)} job(s) in {result.duration_in_s:.2f}s, "
+              f"then reached known jobs.")
+    elif result.is_ok():
+        print(f"Scraper {result.name} found {len(result.jobs)} job(s) in {result.duration_in_s:.2f}s.")
+    elif result.outcome == outcome_error:
+        print(f"Exception in scraper {result.name} after {result.duration_in_s:.2f}s: {result.error}")
+    elif result.outcome == outcome_timeout:
+        print(f"Scraper {result.name} timed out after {result.duration_in_s:.2f}s.")
+    elif result.outcome == outcome_skipped:
+        print(f"Scraper {result.name} was skipped, its circuit is open.")
+    else:
+        print(f"Scraper {result.name} did not finish before the check deadline.")
+
+
+def run_scrapers(
+        scrapers: set[AbstractScraper],
+        max_workers: int,
+        timeout_in_s: float,
+        deadline_in_s: float,
+        process_pool: ScraperProcessPool | None = None,
+        known_jobs: dict[AbstractScraper, set[tuple[str, str]]] | None = None
+) -> list[ScraperResult]:
+    """
+    Runs every scraper on a pool of at most max_workers
+    threads and collects their results. Async scrapers
+    don't take up a thread, they all run together on the
+    shared async scraper event loop. If a process pool is
+    given, regular scrapers run in it instead, and
+    max_workers is ignored.
+
+    Streaming scrapers with an entry in known_jobs are
+    stopped once they reach a run of those jobs. The rest
+    scrape every page.
+
+    A scraper which runs for longer than timeout_in_s, or
+    which hasn't finished once deadline_in_s has passed
+    since the start of the run, is abandoned. Python
+    threads can't be killed, so an abandoned scraper keeps
+    running in the background, but its result is ignored
+    and it no longer holds up the rest of the check. Its
+    thread is a daemon thread, so it doesn't hold up the
+    bot shutting down either. Scrapers which can hang for
+    good are better run in worker processes.
+    Worker processes are killed once they time out.
+
+    :return: One ScraperResult for every given scraper.
+    """
+
+    start_times: dict[AbstractScraper, float] = {}
+
+    if known_jobs is None:
+        known_jobs = {}
+
+    def timed_scrape(scraper: AbstractScraper) -> tuple[set[tuple[str, str]], bool]:
+        start_times[scraper] = time.monotonic()
+
+        with get_check_profiler().profile_scraper(get_scraper_name(scraper)):
+            if isinstance(scraper, StreamingAbstractScraper):
+                return scraper.scrape_until_known(known_jobs.get(scraper))
+
+            return set(scraper.scrape_open_jobs()), True
+
+    def submit(scraper: AbstractScraper) -> Future:
+        if isinstance(scraper, AsyncAbstractScraper):
+            return get_async_scraper_host().submit(
+                scraper,
+                on_start=lambda: start_times.__setitem__(scraper, time.monotonic())
+            )
+
+        if process_pool is not None:
+            return process_pool.submit(
+                scraper,
+                on_start=lambda: start_times.__setitem__(scraper, time.monotonic()),
+                known_jobs=known_jobs.get(scraper)
+            )
+
+        return executor.submit(timed_scrape, scraper)
+
+    results = []
+    cycle_deadline = time.monotonic() + deadline_in_s
+
+    executor = DaemonThreadPool(max(1, max_workers), "scraper")
+    futures: dict[Future, AbstractScraper] = {submit(scraper): scraper for scraper in scrapers}
+    pending = set(futures)
+
+    def finish(future: Future, result: ScraperResult):
+        pending.remove(future)
+        future.cancel()
+        log_result(result)
+        results.append(result)
+
+    try:
+        while len(pending) > 0:
+            # Collect scrapers which have finished
+            done, _ = wait(pending, timeout=0, return_when=FIRST_COMPLETED)
+            for future in done:
+                scraper = futures[future]
+                duration = time.monotonic() - start_times.get(scraper, time.monotonic())
+                try:
+                    # Async scrapers always return every open job
+                    if isinstance(scraper, AsyncAbstractScraper):
+                        jobs, complete = future.result(), True
+                    else:
+                        jobs, complete = future.result()
+
+                    finish(future, ScraperResult(
+                        get_scraper_name(scraper), outcome_ok, jobs, duration, complete=complete
+                    ))
+                except ScraperWorkerTimeout:
+                    finish(future, ScraperResult(get_scraper_name(scraper), outcome_timeout, set(), duration))
+                except Exception as e:
+                    # Arbitrary code execution, anything can go wrong
+                    finish(future, ScraperResult(get_scraper_name(scraper), outcome_error, set(), duration, e))
+
+            # Abandon scrapers which have run out of time
+            now = time.monotonic()
+            next_expiry = cycle_deadline
+
+            for future in list(pending):
+                scraper = futures[future]
+                started = start_times.get(scraper)
+                duration = 0.0 if started is None else now - started
+
+                if started is not None and duration >= timeout_in_s:
+                    finish(future, ScraperResult(get_scraper_name(scraper), outcome_timeout, set(), duration))
+                elif now >= cycle_deadline:
+                    finish(future, ScraperResult(get_scraper_name(scraper), outcome_deadline, set(), duration))
+                elif started is not None:
+                    next_expiry = min(next_expiry, started + timeout_in_s)
+
+            if len(pending) == 0:
+                break
+
+            # Sleep until something finishes or the next
+            # timeout could expire
+            wait(pending, timeout=max(0.0, min(next_expiry - now, poll_interval_in_s)), return_when=FIRST_COMPLETED)
+    finally:
+        executor.shutdown()
+
+    return results
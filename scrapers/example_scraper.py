@@ -7,16 +7,15 @@ example.com
 
 # ---------- IMPORTS ----------
 
-# Pip Sourced Imports
-
-# For most real applications, you'll probably need to
-# use something like Selenium to parse page JavaScript
-import requests
-
-from bs4 import BeautifulSoup
-
 # Local Imports
 from abstract_scraper import AbstractScraper
+from fetch_cache import fetch_cached
+
+# Pulls links out of the page without building a
+# document tree. For most real applications, you'll
+# probably need to use something like Selenium to
+# parse page JavaScript.
+from link_extractor import extract_links
 
 # ---------- CONSTANTS ----------
 
@@ -35,22 +34,12 @@ def log(msg: str):
     print(f"[{jobs_page_domain}] {msg}")
 
 
-def get_jobs_page_source() -> str | None:
+def parse_jobs_page(page_source: str) -> set[tuple[str, str]]:
     """
-    Get the source of the page pointed to by the
-    jobs_page_url constant.
-
-    :return: The source of the jobs page, or None
-             if the status code of the response != 200
+    Parses the source of the jobs page and pulls all
+    jobs (links which point to a job page) out of it.
     """
-
-    response = requests.get(jobs_page_url)
-
-    if response.status_code != requests.codes.ok:
-        print(f"Failed to get source of jobs page ({response.status_code})")
-        return None
-
-    return response.text
+    return set(extract_links([page_source], jobs_page_url, prefix=job_link_prefix))
 
 
 class Scraper(AbstractScraper):
@@ -60,38 +49,15 @@ class Scraper(AbstractScraper):
     """
 
     def scrape_open_jobs(self) -> set[tuple[str, str]]:
-        # Attempt to pull jobs page source
-        page_source = get_jobs_page_source()
-
-        if page_source is None:
-            # Logging done in method
-            return set()
-
-        # Parse page source as HTML and attempt
-        # to grab all links from it
-        soup = BeautifulSoup(page_source, "html.parser")
-        link_elements = soup.find_all('a')
-
-        if link_elements is None:
-            log("Successfully retrieved jobs page, but failed to retrieve link elemenets!")
+        # Attempt to pull and parse the jobs page. If the
+        # page hasn't changed since the last check, the
+        # fetch cache hands back the previous result
+        # without parsing the page again.
+        open_jobs = fetch_cached(jobs_page_url, parse_jobs_page)
+
+        if open_jobs is None:
+            log("Failed to retrieve jobs page!")
             return set()
 
-        # Loop through all potential jobs, and if
-        # it is a job, add it to the set.
-        open_jobs = set()
-
-        for link_element in link_elements:
-            # Get what the link element is actually pointing to
-            # (hopefully a job page)
-            link = link_element.get('href')
-
-            if link is None:
-                # Link element doesn't have a link, somehow
-                continue
-
-            # Check if this is valid job
-            if link.startswith(job_link_prefix):
-                open_jobs.add((link_element.text, link))
-
         log(f"Found {len(open_jobs)} open jobs.")
         return open_jobs
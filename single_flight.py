@@ -0,0 +1,63 @@
+"""
+Single Flight | Written by Joshua Sheldon
+
+Runs a function on a background thread, one run at
+a time. Anyone who asks for a run while one with the
+same arguments is already in flight gets that run's
+future, rather than starting another.
+"""
+
+# ---------- IMPORTS ----------
+
+# Python Default Imports
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import RLock
+from typing import Any, Callable
+
+# ---------- CLASSES ----------
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent requests to run a function with
+    the same arguments into a single run. Runs with
+    different arguments are queued, and run one after
+    another. The returned futures can be waited on
+    from a thread with Future.result(), or from an event
+    loop with asyncio.wrap_future().
+    """
+
+    _function: Callable[..., Any]
+    _executor: ThreadPoolExecutor
+    _lock: RLock
+    _futures: dict[tuple, Future]
+
+    def __init__(self, function: Callable[..., Any], name: str):
+        self._function = function
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+        self._lock = RLock()
+        self._futures = dict()
+
+    def run(self, *args) -> Future:
+        """
+        Queues a run of the function with the given arguments,
+        unless a run with the same arguments is already queued
+        or in flight. The arguments must be hashable.
+
+        :return: The future of the run.
+        """
+
+        with self._lock:
+            future = self._futures.get(args)
+
+            if future is None or future.done():
+                future = self._executor.submit(self._function, *args)
+                self._futures[args] = future
+                future.add_done_callback(lambda done: self._forget(args, done))
+
+            return future
+
+    def _forget(self, args: tuple, future: Future):
+        with self._lock:
+            if self._futures.get(args) is future:
+                del self._futures[args]